@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Count event loop wakeups per second for an idle loop with pending timers.
+
+Loop has nothing to do except waiting for timers, so every wakeup
+which doesn't run a timer is wasted cpu time.
+"""
+import argparse
+import time
+from zmqtulip.selector import ZmqSelector
+try:
+    from asyncio import unix_events
+except ImportError:
+    from tulip import unix_events
+
+ARGS = argparse.ArgumentParser(description="Idle loop wakeups benchmark.")
+ARGS.add_argument(
+    '--duration', action="store", dest='duration',
+    default=3.0, type=float, help='Benchmark duration in seconds')
+ARGS.add_argument(
+    '--interval', action="store", dest='interval',
+    default=0.5, type=float, help='Timer interval in seconds')
+ARGS.add_argument(
+    '--precise', action="store_true", dest='precise',
+    default=False, help='Use precise timers')
+
+
+def run(args):
+    selector = ZmqSelector(precise=args.precise)
+    loop = unix_events.SelectorEventLoop(selector=selector)
+
+    select = selector.select
+    wakeups = 0
+    lateness = []
+
+    def counting_select(timeout=None):
+        nonlocal wakeups
+        wakeups += 1
+        return select(timeout)
+    selector.select = counting_select
+
+    def tick(when):
+        lateness.append(loop.time() - when)
+        when = loop.time() + args.interval
+        loop.call_at(when, tick, when)
+
+    when = loop.time() + args.interval
+    loop.call_at(when, tick, when)
+    loop.call_later(args.duration, loop.stop)
+
+    t0 = time.monotonic()
+    cpu0 = time.process_time()
+    loop.run_forever()
+    elapsed = time.monotonic() - t0
+    cpu = time.process_time() - cpu0
+    loop.close()
+
+    print('wakeups/sec:  {:.1f}'.format(wakeups / elapsed))
+    print('cpu usage:    {:.1f}%'.format(cpu / elapsed * 100))
+    if lateness:
+        print('timer late:   avg {:.3f}ms, max {:.3f}ms'.format(
+            sum(lateness) / len(lateness) * 1000, max(lateness) * 1000))
+
+
+if __name__ == '__main__':
+    run(ARGS.parse_args())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Compare zmqtulip sockets on zmq selector loops and regular loops.
+
+Sockets on a loop with ZmqSelector use level-triggered socket events,
+on any other loop they fall back to edge-triggered zmq.FD plus
+zmq.EVENTS checks. ZmqEventLoop dispatches
+zmq socket events directly to sockets. uvloop is benchmarked
+when it is installed.
+"""
+import argparse
+import time
+import zmq
+import zmqtulip
+from zmqtulip.selector import ZmqSelector, ZmqEpollSelector
+try:
+    from asyncio import unix_events
+except ImportError:
+    from tulip import unix_events
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+ARGS = argparse.ArgumentParser(description="Event loops benchmark.")
+ARGS.add_argument(
+    '--messages', action="store", dest='messages',
+    default=100000, type=int, help='Number of messages')
+ARGS.add_argument(
+    '--size', action="store", dest='size',
+    default=64, type=int, help='Message size')
+ARGS.add_argument(
+    '--addr', action="store", dest='addr',
+    default='ipc:///tmp/zmqtulip-loops', help='Socket address')
+
+
+def loops():
+    yield 'ZmqSelector', lambda: unix_events.SelectorEventLoop(
+        selector=ZmqSelector())
+    yield 'ZmqEpollSelector', lambda: unix_events.SelectorEventLoop(
+        selector=ZmqEpollSelector())
+    yield 'ZmqEventLoop', zmqtulip.ZmqEventLoop
+    yield 'default', unix_events.SelectorEventLoop
+    if uvloop is not None:
+        yield 'uvloop', uvloop.new_event_loop
+
+
+async def throughput(ctx, args):
+    push = ctx.socket(zmq.PUSH)
+    push.bind(args.addr)
+    pull = ctx.socket(zmq.PULL)
+    pull.connect(args.addr)
+
+    data = b'x' * args.size
+    for _ in range(args.messages):
+        push.send(data)
+    for _ in range(args.messages):
+        await pull.recv()
+
+
+async def round_trips(ctx, args):
+    server = ctx.socket(zmq.PAIR)
+    server.bind(args.addr)
+    client = ctx.socket(zmq.PAIR)
+    client.connect(args.addr)
+
+    data = b'x' * args.size
+    for _ in range(args.messages // 10):
+        client.send(data)
+        await server.recv()
+        server.send(data)
+        await client.recv()
+    return args.messages // 10
+
+
+def run_one(loop_factory, bench, args):
+    loop = loop_factory()
+    ctx = zmqtulip.Context(loop=loop)
+
+    t0 = time.monotonic()
+    count = loop.run_until_complete(bench(ctx, args)) or args.messages
+    elapsed = time.monotonic() - t0
+
+    ctx.destroy(linger=0)
+    loop.close()
+    return count / elapsed
+
+
+def run(args):
+    print('{:>18} {:>16} {:>16}'.format('loop', 'msgs/sec', 'rtt/sec'))
+    for name, loop_factory in loops():
+        print('{:>18} {:>16.1f} {:>16.1f}'.format(
+            name,
+            run_one(loop_factory, throughput, args),
+            run_one(loop_factory, round_trips, args)))
+
+
+if __name__ == '__main__':
+    run(ARGS.parse_args())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Compare zmq selectors as number of registered idle fds grows.
+
+Every loop iteration of a zmq ping-pong pays for idle connections
+registered in the same loop: ZmqSelector polls all of them, ZmqEpollSelector
+only gets ready ones from epoll.
+"""
+import argparse
+import socket
+import time
+import zmq
+import zmqtulip
+from zmqtulip.selector import ZmqSelector, ZmqEpollSelector
+try:
+    from asyncio import unix_events
+except ImportError:
+    from tulip import unix_events
+
+ARGS = argparse.ArgumentParser(description="Selector scaling benchmark.")
+ARGS.add_argument(
+    '--fds', action="store", dest='fds',
+    default='0,100,1000,10000', help='Comma separated idle fd counts')
+ARGS.add_argument(
+    '--messages', action="store", dest='messages',
+    default=10000, type=int, help='Number of round trips')
+
+SELECTORS = [ZmqSelector, ZmqEpollSelector]
+
+
+async def ping_pong(client, server, messages):
+    for _ in range(messages):
+        client.send(b'ping')
+        await server.recv()
+        server.send(b'pong')
+        await client.recv()
+
+
+def run_one(selector_class, fds, messages):
+    loop = unix_events.SelectorEventLoop(selector=selector_class())
+    ctx = zmqtulip.Context(loop=loop)
+
+    server = ctx.socket(zmq.PAIR)
+    server.bind('ipc:///tmp/selector-scaling')
+    client = ctx.socket(zmq.PAIR)
+    client.connect('ipc:///tmp/selector-scaling')
+
+    socks = []
+    for _ in range(fds // 2):
+        rsock, wsock = socket.socketpair()
+        socks.extend((rsock, wsock))
+        loop.add_reader(rsock.fileno(), rsock.recv, 1)
+        loop.add_reader(wsock.fileno(), wsock.recv, 1)
+
+    t0 = time.monotonic()
+    loop.run_until_complete(ping_pong(client, server, messages))
+    elapsed = time.monotonic() - t0
+
+    for sock in socks:
+        loop.remove_reader(sock.fileno())
+        sock.close()
+    ctx.destroy(linger=0)
+    loop.close()
+    return elapsed
+
+
+def run(args):
+    print('{:>8} {:>20} {:>12} {:>12}'.format(
+        'fds', 'selector', 'rtt/sec', 'usec/rtt'))
+    for fds in [int(n) for n in args.fds.split(',')]:
+        for selector_class in SELECTORS:
+            elapsed = run_one(selector_class, fds, args.messages)
+            print('{:>8} {:>20} {:>12.1f} {:>12.2f}'.format(
+                fds, selector_class.__name__, args.messages / elapsed,
+                elapsed / args.messages * 1e6))
+
+
+if __name__ == '__main__':
+    run(ARGS.parse_args())
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Compare encode/decode throughput of registered serializers."""
+import argparse
+import time
+import zmqtulip
+
+ARGS = argparse.ArgumentParser(description="Serializers benchmark.")
+ARGS.add_argument(
+    '--number', action="store", dest='number',
+    default=20000, type=int, help='Number of iterations')
+
+SAMPLES = {
+    'small': {'id': 12345, 'method': 'get', 'args': ['key', 1.5, None]},
+    'large': {'rows': [{'id': i, 'name': 'row{}'.format(i), 'value': i * 0.5,
+                        'tags': ['a', 'b'], 'active': bool(i % 2)}
+                       for i in range(100)]},
+}
+
+
+def bench(func, arg, number):
+    t0 = time.perf_counter()
+    for i in range(number):
+        func(arg)
+    return number / (time.perf_counter() - t0)
+
+
+def run(args):
+    print('{:8} {:8} {:>8} {:>14} {:>14}'.format(
+        'codec', 'sample', 'size', 'encode ops/s', 'decode ops/s'))
+    for name in ('pickle', 'json', 'marshal', 'packed'):
+        dumps, loads = zmqtulip.get_serializer(name)
+        for sample, obj in sorted(SAMPLES.items()):
+            number = args.number
+            if sample == 'large':
+                number //= 100
+            data = dumps(obj)
+            print('{:8} {:8} {:8} {:14.0f} {:14.0f}'.format(
+                name, sample, len(data),
+                bench(dumps, obj, number), bench(loads, data, number)))
+
+
+if __name__ == '__main__':
+    run(ARGS.parse_args())
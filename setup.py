@@ -20,12 +20,14 @@ setup(name='pyzmqtulip',
           'License :: OSI Approved :: BSD License',
           'Intended Audience :: Developers',
           'Programming Language :: Python',
-          'Programming Language :: Python :: 3.3'],
+          'Programming Language :: Python :: 3',
+          'Programming Language :: Python :: 3.8'],
       author='Nikolay Kim',
       author_email='fafhrd91@gmail.com',
       url='https://github.com/fafhrd91/pyzmqtulip/',
       license='BSD',
       packages=find_packages(),
+      python_requires='>=3.8',
       install_requires = install_requires,
       tests_require = tests_require,
       test_suite = 'nose.collector',
@@ -3,6 +3,9 @@ try:
     import asyncio as tulip
 except ImportError:
     import tulip
+import pickle
+import threading
+import time
 import unittest
 import unittest.mock
 import zmq
@@ -18,6 +21,7 @@ class CoreTests(unittest.TestCase):
         tulip.set_event_loop(None)
 
     def tearDown(self):
+        self.ctx.destroy(linger=0)
         self.loop.close()
 
     def test_context_global_event_loop(self):
@@ -28,6 +32,21 @@ class CoreTests(unittest.TestCase):
         finally:
             tulip.set_event_loop(None)
 
+    def test_context_serializer(self):
+        ctx = zmqtulip.Context(loop=self.loop, serializer='json')
+        socket = ctx.socket(zmq.PUB)
+        self.assertEqual(
+            zmqtulip.get_serializer('json'), (socket._dumps, socket._loads))
+        socket.close()
+
+        socket = ctx.socket(zmq.PUB, serializer='marshal')
+        self.assertEqual(
+            zmqtulip.get_serializer('marshal'),
+            (socket._dumps, socket._loads))
+        socket.close()
+
+        self.assertRaises(ValueError, socket.set_serializer, 'unknown')
+
     def test_context_socket(self):
         ctx = zmqtulip.Context(loop=self.loop)
         self.assertIs(ctx._loop, self.loop)
@@ -37,51 +56,102 @@ class CoreTests(unittest.TestCase):
         self.assertIsInstance(socket, zmqtulip.core.Socket)
         self.assertIs(socket._loop, self.loop)
 
-    @unittest.mock.patch('zmqtulip.core.zmq.Socket')
-    def test_recv_err(self, zmqSocket):
-        err = zmq.ZMQError()
-        err.errno = -1
-        zmqSocket.recv.side_effect = err
+    def test_persistent_reader(self):
+        add_reader = self.loop.add_reader = unittest.mock.Mock()
+        remove_reader = self.loop.remove_reader = unittest.mock.Mock()
 
-        def recv(sock):
-            try:
-                yield from sock.recv()
-            except zmq.ZMQError as e:
-                return e
+        sock = self.ctx.socket(zmq.PULL, persistent=True)
+        add_reader.assert_called_with(sock._fileobj, sock._read_ready)
+
+        sock._read_ready()
+        self.assertFalse(remove_reader.called)
 
-        sock = self.ctx.socket(zmq.PUB)
-        res = self.loop.run_until_complete(recv(sock))
-        self.assertEqual(res, err)
         sock.close()
+        remove_reader.assert_called_with(sock._fileobj)
 
-    def test_send_checks(self):
+    def test_flush_budget(self):
         sock = self.ctx.socket(zmq.PUSH)
+        sock.set_flush_budget(max_messages=2)
 
-        self.assertRaises(AssertionError, sock.send, 'test')
-        self.assertIsNone(sock.send(b''))
+        send = unittest.mock.Mock()
+        futs = []
+        for i in range(5):
+            fut = tulip.Future(loop=self.loop)
+            sock._buffer.append(
+                (fut, send, (b'data', 0, True, False), 4, None))
+            futs.append(fut)
+        sock._buffer_size = 20
+
+        sock._send_ready()
+        self.assertEqual(2, send.call_count)
+        self.assertEqual(3, len(sock._buffer))
+        self.assertEqual(12, sock._buffer_size)
+        self.assertIsNotNone(sock._flush_handle)
+        self.assertFalse(sock._writing)
 
-        sock._send_exc = ValueError('err')
-        self.assertRaises(ValueError, sock.send, b'test')
+        sock.set_flush_budget(max_bytes=6)
+        sock._send_ready()
+        self.assertEqual(4, send.call_count)
+        self.assertEqual(1, len(sock._buffer))
 
-    def test_exception(self):
+        sock.set_flush_budget()
+        sock._send_ready()
+        self.assertEqual(5, send.call_count)
+        self.assertTrue(all(fut.done() for fut in futs))
+        self.assertIsNone(sock._flush_handle)
+        sock.close()
+
+    def test_poll_trackers(self):
         sock = self.ctx.socket(zmq.PUSH)
+        tracker = unittest.mock.Mock(done=False)
+        fut = tulip.Future(loop=self.loop)
+        fut.set_result(tracker)
+
+        released = sock._track(fut)
+        self.assertEqual([(tracker, released)], sock._trackers)
+        self.assertIsNotNone(sock._tracker_handle)
+
+        sock._poll_trackers()
+        self.assertEqual(
+            zmqtulip.core.TRACKER_MIN_DELAY * 2, sock._tracker_delay)
+        self.assertFalse(released.done())
+
+        tracker.done = True
+        sock._poll_trackers()
+        self.assertIs(tracker, released.result())
+        self.assertEqual([], sock._trackers)
+        self.assertIsNone(sock._tracker_handle)
+        sock.close()
+
+    def test_recv_err(self):
+        err = zmq.ZMQError(zmq.EFAULT)
+
+        async def recv(sock):
+            try:
+                await sock.recv()
+            except zmq.ZMQError as e:
+                return e
 
-        val = sock._send_exc = (ValueError('err'), 1)
-        self.assertEqual(sock.exception(), val)
+        sock = self.ctx.socket(zmq.PULL)
+        with unittest.mock.patch.object(zmq.Socket, 'recv', side_effect=err):
+            res = self.loop.run_until_complete(recv(sock))
+        self.assertIs(res, err)
+        self.assertFalse(sock._recv_waiters)
+        sock.close()
 
-    def test_clear_exception(self):
+    def test_send_checks(self):
         sock = self.ctx.socket(zmq.PUSH)
-        add_writer = self.loop.add_writer = unittest.mock.Mock()
 
-        sock._send_exc = (ValueError('err'), 1)
-        sock.clear_exception()
-        self.assertIsNone(sock.exception())
-        self.assertFalse(add_writer.called)
+        self.assertRaises(AssertionError, sock.send, 'test')
+        self.assertIsNone(sock.send(b''))
 
-        sock._send_exc = (ValueError('err'), 1)
-        sock._buffer.append((1, 2, 3))
-        sock.clear_exception()
-        add_writer.assert_called_with(sock._sock_fd, sock._send_ready)
+        # errors other than EAGAIN fail returned future
+        err = zmq.ZMQError(zmq.EFAULT)
+        with unittest.mock.patch.object(zmq.Socket, 'send', side_effect=err):
+            fut = sock.send(b'test')
+        self.assertIs(err, fut.exception())
+        self.assertFalse(sock._buffer)
+        sock.close()
 
 
 class CoreIntegrationalTests(unittest.TestCase):
@@ -93,8 +163,15 @@ class CoreIntegrationalTests(unittest.TestCase):
         tulip.set_event_loop(None)
 
     def tearDown(self):
+        self.srv_ctx.destroy(linger=0)
+        self.c_ctx.destroy(linger=0)
         self.loop.close()
 
+    def sleep(self, delay):
+        fut = tulip.Future(loop=self.loop)
+        self.loop.call_later(delay, fut.set_result, None)
+        self.loop.run_until_complete(fut)
+
     def test_recv(self):
         # server
         srv_sock = self.srv_ctx.socket(zmq.PUSH)
@@ -105,22 +182,60 @@ class CoreIntegrationalTests(unittest.TestCase):
         client_sock = self.c_ctx.socket(zmq.PULL)
         client_sock.connect('ipc:///tmp/zmqtest')
 
-        @tulip.coroutine
-        def get_data(sock):
-            return (yield from sock.recv())
+        async def get_data(sock):
+            return (await sock.recv())
 
         self.assertEqual(
             b'test data',
             self.loop.run_until_complete(get_data(client_sock)))
 
+    def test_recv_unregisters_reader(self):
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+        self.loop.call_later(0.05, srv_sock.send, b'test data')
+
+        async def get_data(sock):
+            return (await sock.recv())
+
+        self.assertEqual(
+            b'test data',
+            self.loop.run_until_complete(get_data(client_sock)))
+        self.assertFalse(client_sock._reading)
+        self.assertRaises(
+            KeyError, self.loop._selector.get_key, client_sock._fileobj)
+
+    def test_recv_persistent(self):
+        client_sock = self.c_ctx.socket(zmq.PULL, persistent=True)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        async def get_data(sock):
+            return (await sock.recv())
+
+        for data in (b'data1', b'data2'):
+            self.loop.call_later(0.05, srv_sock.send, data)
+            self.assertEqual(
+                data, self.loop.run_until_complete(get_data(client_sock)))
+            self.assertTrue(client_sock._reading)
+            self.loop._selector.get_key(client_sock._fileobj)
+
+        client_sock.close()
+        self.assertNotIn(
+            client_sock,
+            [key.fileobj for key in self.loop._selector.get_map().values()])
+
     def test_recv_cancelled(self):
         # client
         client_sock = self.c_ctx.socket(zmq.PULL)
         client_sock.connect('ipc:///tmp/zmqtest')
 
-        @tulip.coroutine
-        def get_data(sock):
-            return (yield from sock.recv())
+        async def get_data(sock):
+            return (await sock.recv())
 
         task = tulip.Task(get_data(client_sock), loop=self.loop)
         self.loop.call_later(0.1, task.cancel)
@@ -132,9 +247,8 @@ class CoreIntegrationalTests(unittest.TestCase):
         client_sock = self.c_ctx.socket(zmq.PULL)
         client_sock.connect('ipc:///tmp/zmqtest')
 
-        @tulip.coroutine
-        def get_data(sock):
-            return (yield from sock.recv(zmq.NOBLOCK))
+        async def get_data(sock):
+            return (await sock.recv(zmq.NOBLOCK))
 
         self.assertRaises(
             zmq.ZMQError, self.loop.run_until_complete, get_data(client_sock))
@@ -149,10 +263,877 @@ class CoreIntegrationalTests(unittest.TestCase):
         client_sock = self.c_ctx.socket(zmq.PULL)
         client_sock.connect('ipc:///tmp/zmqtest')
 
-        @tulip.coroutine
-        def get_data(sock):
-            return (yield from sock.recv_pyobj())
+        async def get_data(sock):
+            return (await sock.recv_pyobj())
 
         self.assertEqual(
             ('rec1', 'rec2'),
             self.loop.run_until_complete(get_data(client_sock)))
+
+    def test_recv_many(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        for i in range(5):
+            srv_sock.send(b'data' + str(i).encode())
+        self.sleep(0.1)
+
+        async def get_data(sock, *args):
+            return (await sock.recv_many(*args))
+
+        self.assertEqual(
+            [b'data0', b'data1', b'data2'],
+            self.loop.run_until_complete(get_data(client_sock, 3)))
+        self.assertEqual(
+            [b'data3', b'data4'],
+            self.loop.run_until_complete(get_data(client_sock)))
+        self.assertRaises(
+            ValueError, self.loop.run_until_complete,
+            get_data(client_sock, 0))
+
+    def test_recv_many_max_bytes(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        for i in range(5):
+            srv_sock.send(b'data' + str(i).encode())
+        self.sleep(0.1)
+
+        async def get_data(sock, *args):
+            return (await sock.recv_many(*args))
+
+        self.assertEqual(
+            [b'data0', b'data1'],
+            self.loop.run_until_complete(get_data(client_sock, 10, 8)))
+
+    def test_recv_concurrent_waiters(self):
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        async def get_data(sock):
+            return (await sock.recv())
+
+        tasks = [tulip.Task(get_data(client_sock), loop=self.loop)
+                 for i in range(3)]
+        self.sleep(0.05)
+        self.assertEqual(3, len(client_sock._recv_waiters))
+
+        tasks[0].cancel()
+        for i in range(3):
+            srv_sock.send(b'data' + str(i).encode())
+
+        self.assertEqual(
+            b'data0', self.loop.run_until_complete(tasks[1]))
+        self.assertEqual(
+            b'data1', self.loop.run_until_complete(tasks[2]))
+        self.assertFalse(client_sock._recv_waiters)
+        self.assertFalse(client_sock._reading)
+
+        self.assertEqual(
+            b'data2', self.loop.run_until_complete(get_data(client_sock)))
+
+    def test_send_buffers(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        async def get_data(sock):
+            return (await sock.recv())
+
+        for data in (bytearray(b'data1'), memoryview(b'data2'),
+                     zmq.Frame(b'data3')):
+            for copy in (True, False):
+                srv_sock.send(data, copy=copy)
+                self.assertEqual(
+                    bytes(data),
+                    self.loop.run_until_complete(get_data(client_sock)))
+
+        class Buffer(bytearray):
+            def __bool__(self):
+                raise ValueError('truth value is ambiguous')
+
+        for copy in (True, False):
+            self.assertIsNone(srv_sock.send(Buffer(), copy=copy))
+            srv_sock.send(Buffer(b'data4'), copy=copy)
+            self.assertEqual(
+                b'data4', self.loop.run_until_complete(get_data(client_sock)))
+
+    def test_send_buffered(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        data = bytearray(b'data1')
+        fut1 = srv_sock.send(data)
+        fut2 = srv_sock.send(memoryview(b'data2'), copy=False)
+        self.assertEqual(2, len(srv_sock._buffer))
+        data[:] = b'other'
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        async def get_data(sock):
+            return (await sock.recv())
+
+        self.loop.run_until_complete(fut2)
+        self.assertTrue(fut1.done())
+        self.assertFalse(srv_sock._buffer)
+
+        self.assertEqual(
+            b'data1', self.loop.run_until_complete(get_data(client_sock)))
+        self.assertEqual(
+            b'data2', self.loop.run_until_complete(get_data(client_sock)))
+
+    def test_multipart(self):
+        srv_sock = self.srv_ctx.socket(zmq.ROUTER)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.DEALER)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        async def echo(sock):
+            msg = await sock.recv_multipart()
+            await sock.send_multipart(msg + [b'pong'])
+
+        async def request(sock):
+            await sock.send_multipart([b'', bytearray(b'ping')])
+            return (await sock.recv_multipart())
+
+        tulip.Task(echo(srv_sock), loop=self.loop)
+        self.assertEqual(
+            [b'', b'ping', b'pong'],
+            self.loop.run_until_complete(request(client_sock)))
+
+    def test_send_multipart_buffered(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        srv_sock.send_multipart([b'msg1', b'part1'])
+        fut = srv_sock.send_multipart([b'msg2', b'part2'])
+        self.assertEqual(2, len(srv_sock._buffer))
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+        self.loop.run_until_complete(fut)
+
+        async def get_data(sock):
+            return (await sock.recv_multipart())
+
+        self.assertEqual(
+            [b'msg1', b'part1'],
+            self.loop.run_until_complete(get_data(client_sock)))
+        self.assertEqual(
+            [b'msg2', b'part2'],
+            self.loop.run_until_complete(get_data(client_sock)))
+
+    def test_send_buffer_limits(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+        srv_sock.set_buffer_limits(max_messages=3, max_bytes=10)
+        self.assertRaises(
+            ValueError, srv_sock.set_buffer_limits, max_messages=0)
+        self.assertRaises(ValueError, srv_sock.set_buffer_limits, max_bytes=-1)
+        self.assertEqual(
+            (3, 10), (srv_sock._max_messages, srv_sock._max_bytes))
+
+        srv_sock.send(b'data1')
+        srv_sock.send(b'data2')
+        self.assertEqual(10, srv_sock.get_buffer_size())
+        self.assertRaises(zmq.Again, srv_sock.send, b'data3', zmq.NOBLOCK)
+
+        srv_sock.set_buffer_limits(max_messages=3)
+        srv_sock.send(b'data3', zmq.NOBLOCK)
+        self.assertRaises(zmq.Again, srv_sock.send, b'data4', zmq.NOBLOCK)
+
+        drain = tulip.Task(srv_sock.drain(), loop=self.loop)
+        self.sleep(0.05)
+        self.assertFalse(drain.done())
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+        self.loop.run_until_complete(drain)
+        self.assertLess(len(srv_sock._buffer), 3)
+
+        srv_sock.set_buffer_limits()
+        self.loop.run_until_complete(srv_sock.drain())
+        self.assertEqual(0, srv_sock.get_buffer_size())
+
+    def test_send_buffer_limits_wait(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+        srv_sock.set_buffer_limits(max_messages=2)
+
+        # under the limit NOBLOCK send is buffered on EAGAIN
+        futs = [srv_sock.send(b'data0', zmq.NOBLOCK)]
+        futs += [srv_sock.send('data{}'.format(i).encode())
+                 for i in range(1, 5)]
+        self.assertEqual(2, len(srv_sock._buffer))
+        self.assertEqual(10, srv_sock.get_buffer_size())
+        self.assertRaises(zmq.Again, srv_sock.send, b'data5', zmq.NOBLOCK)
+
+        futs[3].cancel()
+        self.sleep(0.05)
+        self.assertFalse(any(fut.done() for fut in futs[:3]))
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+        self.loop.run_until_complete(tulip.gather(futs[2], futs[4]))
+        self.assertEqual(0, srv_sock.get_buffer_size())
+
+        async def get_data(sock):
+            return [(await sock.recv()) for _ in range(4)]
+
+        self.assertEqual(
+            [b'data0', b'data1', b'data2', b'data4'],
+            self.loop.run_until_complete(get_data(client_sock)))
+
+    def test_send_noblock_unbounded(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        self.assertRaises(zmq.Again, srv_sock.send, b'data1', zmq.NOBLOCK)
+        fut1 = srv_sock.send(b'data1')
+        fut2 = srv_sock.send(b'data2', zmq.NOBLOCK)
+        self.assertEqual(2, len(srv_sock._buffer))
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+        self.loop.run_until_complete(tulip.gather(fut1, fut2))
+
+    def test_close_send_buffer(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+        srv_sock.set_buffer_limits(max_messages=1)
+
+        fut1 = srv_sock.send(b'data1')
+        fut2 = srv_sock.send(b'data2')
+        drain = tulip.Task(srv_sock.drain(), loop=self.loop)
+        self.sleep(0.01)
+        self.assertFalse(drain.done())
+
+        srv_sock.close(linger=0)
+        self.assertEqual(0, srv_sock.get_buffer_size())
+        self.assertFalse(srv_sock._buffer)
+        for fut in (fut1, fut2, drain):
+            self.assertRaises(
+                zmq.ZMQError, self.loop.run_until_complete, fut)
+            self.assertEqual(zmq.ENOTSOCK, fut.exception().errno)
+
+    def test_stream(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        for i in range(10):
+            srv_sock.send(b'data' + str(i).encode())
+
+        async def get_data(stream, count):
+            messages = []
+            for i in range(count):
+                messages.append((await stream.next()))
+            return messages
+
+        stream = client_sock.stream(prefetch=4)
+        self.assertEqual(
+            [b'data' + str(i).encode() for i in range(10)],
+            self.loop.run_until_complete(get_data(stream, 10)))
+        self.assertLessEqual(len(stream._messages), 4)
+
+        stream.close()
+        self.assertIsNone(stream._fetch)
+        self.assertFalse(
+            [fut for fut, *args in client_sock._recv_waiters
+             if not fut.cancelled()])
+
+    def test_stream_aiter(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+        srv_sock.send(b'data')
+
+        self.assertIs(client_sock, client_sock.__aiter__())
+        self.assertEqual(
+            b'data', self.loop.run_until_complete(client_sock.__anext__()))
+
+        fut = tulip.Task(client_sock.__anext__(), loop=self.loop)
+        self.loop.call_soon(client_sock.close)
+        self.assertRaises(
+            StopAsyncIteration, self.loop.run_until_complete, fut)
+
+    def test_aiter_break(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+        for data in (b'm0', b'm1', b'm2', b'm3'):
+            srv_sock.send(data)
+        self.sleep(0.05)
+
+        async def get_data(sock):
+            async for msg in sock:
+                break
+            res = [msg, (await sock.recv()), (await sock.recv_many())]
+            async for msg in sock:
+                res.append(msg)
+                break
+            return res
+
+        # loop leaves no pending recv behind, messages it read ahead
+        # are returned by following calls in order
+        task = tulip.Task(get_data(client_sock), loop=self.loop)
+        self.loop.call_later(0.05, srv_sock.send, b'm4')
+        self.assertEqual(
+            [b'm0', b'm1', [b'm2', b'm3'], b'm4'],
+            self.loop.run_until_complete(task))
+        self.assertFalse(client_sock._recv_waiters)
+        self.assertFalse(client_sock._readahead)
+
+    def test_aiter_break_any_recv(self):
+        srv_sock = self.srv_ctx.socket(zmq.DEALER)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.DEALER)
+        client_sock.connect('ipc:///tmp/zmqtest')
+        srv_sock.send_multipart([b'h1', b'body1'])
+        srv_sock.send_multipart([b'h2', b'body2'])
+        srv_sock.send_pyobj({'key': 'value'})
+        srv_sock.send(b'data')
+        srv_sock.send(b'frame')
+        self.sleep(0.05)
+
+        async def get_data(sock):
+            async for frame in sock:
+                break
+            return [frame,
+                    (await sock.recv_multipart()),
+                    (await sock.recv_multipart()),
+                    (await sock.recv_pyobj()),
+                    (await sock.recv(copy=False)).bytes,
+                    (await sock.recv_multipart(copy=False))[0].bytes]
+
+        # read-ahead keeps message boundaries and serves every recv
+        self.assertEqual(
+            [b'h1', [b'body1'], [b'h2', b'body2'], {'key': 'value'},
+             b'data', b'frame'],
+            self.loop.run_until_complete(get_data(client_sock)))
+        self.assertFalse(client_sock._readahead)
+        self.assertEqual(5, client_sock.stats()['messages_received'])
+
+    def test_async_await(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        async def get_data(sock):
+            return [await sock.recv(),
+                    await sock.recv_multipart(),
+                    await sock.recv_pyobj(),
+                    await sock.recv_obj()]
+
+        def send():
+            srv_sock.send(b'data')
+            srv_sock.send_multipart([b'part1', b'part2'])
+            srv_sock.send_pyobj({'key': 'value'})
+            srv_sock.send_obj(['obj'])
+
+        self.loop.call_later(0.05, send)
+        self.assertEqual(
+            [b'data', [b'part1', b'part2'], {'key': 'value'}, ['obj']],
+            self.loop.run_until_complete(get_data(client_sock)))
+
+    def test_recv_ready_does_not_suspend(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+        for data in (b'data1', b'data2'):
+            srv_sock.send(data)
+        self.sleep(0.05)
+
+        coro = client_sock.recv()
+        with self.assertRaises(StopIteration) as cm:
+            coro.send(None)
+        self.assertEqual(b'data1', cm.exception.value)
+
+        stream = client_sock.stream()
+        self.assertEqual(
+            b'data2', self.loop.run_until_complete(stream.__anext__()))
+        srv_sock.send(b'data3')
+        self.sleep(0.05)
+        coro = stream.__anext__()
+        with self.assertRaises(StopIteration) as cm:
+            coro.send(None)
+        self.assertEqual(b'data3', cm.exception.value)
+        stream.close()
+
+    @unittest.skipUnless(
+        pickle.HIGHEST_PROTOCOL >= 5, 'requires pickle protocol 5')
+    def test_pyobj_out_of_band(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        async def get_data(sock):
+            return (await sock.recv_multipart())
+
+        payload = bytearray(b'x' * zmqtulip.core.OOB_THRESHOLD)
+        srv_sock.send_pyobj(
+            {'small': pickle.PickleBuffer(b'small'),
+             'large': pickle.PickleBuffer(payload)})
+        frames = self.loop.run_until_complete(get_data(client_sock))
+        self.assertEqual(2, len(frames))
+        self.assertEqual(bytes(payload), frames[1])
+
+        srv_sock.send_pyobj(
+            ('obj', pickle.PickleBuffer(payload), pickle.PickleBuffer(b'1')))
+
+        async def get_obj(sock):
+            return (await sock.recv_pyobj())
+
+        obj = self.loop.run_until_complete(get_obj(client_sock))
+        self.assertEqual('obj', obj[0])
+        self.assertEqual(bytes(payload), bytes(obj[1]))
+        self.assertEqual(b'1', bytes(obj[2]))
+
+    def test_pyobj_protocol(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        async def get_data(sock):
+            return (await sock.recv_pyobj())
+
+        srv_sock.send_pyobj(('rec1', b'rec2'), protocol=2)
+        self.assertEqual(
+            ('rec1', b'rec2'),
+            self.loop.run_until_complete(get_data(client_sock)))
+
+    def test_obj(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH, serializer='packed')
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+        client_sock.set_serializer('packed')
+
+        async def get_data(sock):
+            return (await sock.recv_obj())
+
+        srv_sock.send_obj({'key': ['value', 1]})
+        self.assertEqual(
+            {'key': ['value', 1]},
+            self.loop.run_until_complete(get_data(client_sock)))
+
+    def test_recv_edge_consumed_by_send(self):
+        srv_sock = self.srv_ctx.socket(zmq.DEALER)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.DEALER)
+        client_sock.connect('ipc:///tmp/zmqtest')
+        self.loop.run_until_complete(client_sock.send(b'hello'))
+
+        async def get_data(sock):
+            return (await sock.recv())
+
+        self.assertEqual(
+            b'hello', self.loop.run_until_complete(get_data(srv_sock)))
+
+        task = tulip.Task(get_data(srv_sock), loop=self.loop)
+        self.sleep(0.05)
+        self.assertEqual(1, len(srv_sock._recv_waiters))
+
+        client_sock.send(b'data')
+        time.sleep(0.1)
+
+        # send processes pending zmq commands and resets zmq.FD
+        srv_sock.send(b'other')
+        self.loop.call_later(1.0, task.cancel)
+        self.assertEqual(b'data', self.loop.run_until_complete(task))
+
+    def test_eagain_checks_events(self):
+        sock = self.srv_ctx.socket(zmq.DEALER)
+        sock.bind('ipc:///tmp/zmqtest')
+        fut = sock.send(b'data')
+        self.assertTrue(sock._buffer)
+        if sock._level_triggered:
+            return
+
+        # failed libzmq operation may consume zmq.FD edge which
+        # announced readiness of the other direction
+        getsockopt = sock.getsockopt
+        sock.getsockopt = unittest.mock.Mock(
+            side_effect=lambda opt: zmq.POLLOUT if opt == zmq.EVENTS
+            else getsockopt(opt))
+        for call in (lambda: sock.recv(zmq.NOBLOCK).send(None),
+                     lambda: sock.recv().send(None),
+                     lambda: sock.recv_many().send(None)):
+            self.assertTrue(sock._fd_reader)
+            self.assertIsNone(sock._events_handle)
+            try:
+                call()
+            except (zmq.Again, StopIteration):
+                pass
+            self.assertIsNotNone(sock._events_handle)
+            sock._events_handle.cancel()
+            sock._events_handle = None
+
+        # and so does failed send while recv waits
+        sock._buffer.clear()
+        sock._buffer_size = 0
+        sock.getsockopt = unittest.mock.Mock(
+            side_effect=lambda opt: zmq.POLLIN if opt == zmq.EVENTS
+            else getsockopt(opt))
+        sock.send(b'data2')
+        self.assertIsNotNone(sock._events_handle)
+        sock._events_handle.cancel()
+        sock._events_handle = None
+
+        sock._recv_waiters.clear()
+        fut.cancel()
+
+    def test_send_threadsafe(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        def produce(idx):
+            for i in range(100):
+                srv_sock.send_threadsafe(bytearray(b'%d-%d' % (idx, i)))
+            srv_sock.send_multipart_threadsafe([b'%d' % idx, b'end'])
+
+        threads = [threading.Thread(target=produce, args=(idx,))
+                   for idx in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        async def get_data(sock):
+            res = []
+            for _ in range(408):
+                res.append((await sock.recv()))
+            return res
+
+        messages = self.loop.run_until_complete(get_data(client_sock))
+        self.assertEqual(408, len(messages))
+        for idx in range(4):
+            self.assertEqual(
+                [b'%d-%d' % (idx, i) for i in range(100)] + [b'%d' % idx],
+                [msg for msg in messages
+                 if msg.startswith(b'%d' % idx)])
+        self.assertEqual(4, messages.count(b'end'))
+
+        # loop was not running, all messages went out in one batch
+        self.assertEqual(1, srv_sock.stats()['threadsafe_wakeups'])
+
+    def test_send_threadsafe_errors(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        self.assertRaises(
+            AssertionError, srv_sock.send_multipart_threadsafe,
+            [b'data', 'text'])
+        self.assertRaises(
+            AssertionError, srv_sock.send_multipart_threadsafe, [])
+
+        handler = unittest.mock.Mock()
+        self.loop.set_exception_handler(handler)
+
+        # failed send does not stall the rest of the batch
+        srv_sock._submit_threadsafe(
+            unittest.mock.Mock(side_effect=ValueError), ())
+        srv_sock.send_threadsafe(b'data')
+
+        self.assertEqual(
+            b'data', self.loop.run_until_complete(client_sock.recv()))
+        self.assertFalse(srv_sock._ts_queue)
+
+        # dropped messages are reported and counted
+        self.assertEqual(1, handler.call_count)
+        context = handler.call_args[0][1]
+        self.assertIsInstance(context['exception'], ValueError)
+        self.assertIs(srv_sock, context['socket'])
+
+        srv_sock.set_buffer_limits(max_messages=1)
+        srv_sock._buffer.append(
+            (tulip.Future(loop=self.loop), None, (), 4, None))
+        srv_sock.send_threadsafe(b'full', zmq.NOBLOCK)
+        self.sleep(0.01)
+        srv_sock._buffer.clear()
+        self.assertEqual(2, handler.call_count)
+        self.assertIsInstance(handler.call_args[0][1]['exception'], zmq.Again)
+        self.assertEqual(2, srv_sock.stats()['threadsafe_errors'])
+
+    def test_check_events(self):
+        sock = self.srv_ctx.socket(zmq.DEALER)
+        sock._level_triggered = False
+        sock.getsockopt = unittest.mock.Mock(return_value=zmq.POLLOUT)
+
+        sock._check_events()
+        self.assertIsNone(sock._events_handle)
+
+        sock._recv_waiters.append(
+            (tulip.Future(loop=self.loop), None, 0, True, False))
+        sock._check_events()
+        self.assertIsNone(sock._events_handle)
+
+        sock.getsockopt.return_value = zmq.POLLIN | zmq.POLLOUT
+        sock._check_events()
+        self.assertIsNotNone(sock._events_handle)
+        sock._recv_waiters.clear()
+        sock.close()
+        self.assertIsNone(sock._events_handle)
+
+    def test_histograms(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+        self.assertIsNone(srv_sock.histograms())
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.enable_histograms()
+        srv_sock.enable_histograms()
+
+        fut = srv_sock.send(b'data1')
+        srv_sock.send(b'data2')
+
+        async def get_data(sock):
+            return (await sock.recv())
+
+        task = tulip.Task(get_data(client_sock), loop=self.loop)
+        self.sleep(0.05)
+        client_sock.connect('ipc:///tmp/zmqtest')
+        self.loop.run_until_complete(fut)
+        self.assertEqual(b'data1', self.loop.run_until_complete(task))
+        self.loop.run_until_complete(get_data(client_sock))
+
+        queue = srv_sock.histograms()['send_queue']
+        self.assertEqual(2, queue['count'])
+        self.assertGreaterEqual(queue['max'], 0.05)
+
+        recv = client_sock.histograms()['recv_wait']
+        self.assertEqual(2, recv['count'])
+        self.assertGreaterEqual(recv['max'], 0.05)
+
+        srv_sock.enable_histograms(False)
+        self.assertIsNone(srv_sock.histograms())
+
+    def test_stats(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        srv_sock.send(b'data1')
+        fut = srv_sock.send_multipart([b'data2', b'part'])
+        stats = srv_sock.stats()
+        self.assertEqual(0, stats['messages_sent'])
+        self.assertEqual(2, stats['buffer'])
+        self.assertEqual(14, stats['buffer_bytes'])
+        self.assertEqual(2, stats['peak_buffer'])
+        self.assertEqual(1, stats['eagain'])
+        self.assertEqual(1, stats['writer_registrations'])
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+        self.loop.run_until_complete(fut)
+
+        async def get_data(sock):
+            await sock.recv()
+            return (await sock.recv_multipart())
+
+        self.loop.run_until_complete(get_data(client_sock))
+
+        stats = srv_sock.stats()
+        self.assertEqual(2, stats['messages_sent'])
+        self.assertEqual(14, stats['bytes_sent'])
+        self.assertEqual(0, stats['buffer'])
+
+        stats = client_sock.stats()
+        self.assertEqual(2, stats['messages_received'])
+        self.assertEqual(14, stats['bytes_received'])
+
+        pub_sock = self.c_ctx.socket(zmq.PUB)
+        pub_sock.send(b'data3', zmq.NOBLOCK)
+        stats = self.c_ctx.stats()
+        self.assertEqual(2, stats['sockets'])
+        self.assertEqual(1, stats['messages_sent'])
+        self.assertEqual(2, stats['messages_received'])
+
+    def test_send_track(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        data = bytearray(b'x' * 1024 * 1024)
+        fut = srv_sock.send(data, copy=False, track=True)
+        self.assertFalse(fut.done())
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        tracker = self.loop.run_until_complete(fut)
+        self.assertIsInstance(tracker, zmq.MessageTracker)
+        self.assertTrue(tracker.done)
+        self.assertFalse(srv_sock._trackers)
+
+        fut = srv_sock.send_multipart(
+            [b'head', memoryview(data)], copy=False, track=True)
+        self.assertTrue(self.loop.run_until_complete(fut).done)
+
+    def test_recv_timeout(self):
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        async def get_data(sock, timeout):
+            return (await sock.recv(timeout=timeout))
+
+        task1 = tulip.Task(get_data(client_sock, 0.05), loop=self.loop)
+        task2 = tulip.Task(get_data(client_sock, 1.0), loop=self.loop)
+        task3 = tulip.Task(get_data(client_sock, 0.1), loop=self.loop)
+        self.sleep(0.01)
+        self.assertEqual(3, len(client_sock._timeouts))
+        self.assertEqual(
+            client_sock._timeouts[0][0], client_sock._timeout_at)
+
+        self.assertRaises(
+            tulip.TimeoutError, self.loop.run_until_complete, task1)
+        self.assertRaises(
+            tulip.TimeoutError, self.loop.run_until_complete, task3)
+        self.assertEqual(1, len(client_sock._recv_waiters))
+        self.assertTrue(client_sock._reading)
+
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+        srv_sock.send(b'data')
+        self.assertEqual(b'data', self.loop.run_until_complete(task2))
+
+        task = tulip.Task(get_data(client_sock, 0.01), loop=self.loop)
+        self.assertRaises(
+            tulip.TimeoutError, self.loop.run_until_complete, task)
+        self.assertFalse(client_sock._recv_waiters)
+        self.assertFalse(client_sock._reading)
+        self.assertIsNone(client_sock._timeout_handle)
+
+    def test_recv_timeout_completed(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        async def get_data(sock, count):
+            res = []
+            for i in range(count):
+                self.loop.call_later(
+                    0.001, srv_sock.send, b'data' + str(i).encode())
+                res.append((await sock.recv(timeout=60)))
+            return res
+
+        self.assertEqual(
+            [b'data' + str(i).encode() for i in range(10)],
+            self.loop.run_until_complete(get_data(client_sock, 10)))
+        self.sleep(0.01)
+
+        # completed operations do not keep messages until deadline
+        self.assertLessEqual(len(client_sock._timeouts), 1)
+        self.assertFalse(
+            [entry for entry in client_sock._timeouts
+             if entry[2] is not None])
+        self.assertIsNone(client_sock._timeout_handle)
+
+    def test_send_timeout(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        fut1 = srv_sock.send(b'data1', timeout=0.01)
+        fut2 = srv_sock.send_multipart([b'data2'], timeout=0.01)
+        self.assertTrue(srv_sock._writing)
+        self.assertRaises(
+            tulip.TimeoutError, self.loop.run_until_complete, fut1)
+        self.assertRaises(
+            tulip.TimeoutError, self.loop.run_until_complete, fut2)
+        self.assertFalse(srv_sock._buffer)
+        self.assertEqual(0, srv_sock.get_buffer_size())
+        self.assertFalse(srv_sock._writing)
+
+
+class DefaultLoopIntegrationalTests(CoreIntegrationalTests):
+    """Run integrational tests on regular selector event loop."""
+
+    def setUp(self):
+        self.loop = tulip.new_event_loop()
+        self.srv_ctx = zmqtulip.Context(loop=self.loop)
+        self.c_ctx = zmqtulip.Context(loop=self.loop)
+        tulip.set_event_loop(None)
+
+    def test_edge_triggered(self):
+        sock = self.srv_ctx.socket(zmq.PULL)
+        self.assertFalse(sock._level_triggered)
+        self.assertEqual(sock.getsockopt(zmq.FD), sock._fileobj)
+
+    def test_send_backpressure(self):
+        srv_sock = self.srv_ctx.socket(zmq.PUSH)
+        srv_sock.setsockopt(zmq.SNDHWM, 1)
+        srv_sock.bind('ipc:///tmp/zmqtest')
+
+        client_sock = self.c_ctx.socket(zmq.PULL)
+        client_sock.setsockopt(zmq.RCVHWM, 1)
+        client_sock.connect('ipc:///tmp/zmqtest')
+
+        data = [str(i).encode() * 1000 for i in range(100)]
+        futs = [srv_sock.send(item) for item in data]
+        self.assertTrue(srv_sock._buffer)
+
+        # zmq.FD is never registered as writer, blocked socket does not
+        # wake up the loop until its peer reads
+        self.sleep(0.1)
+        eagain = srv_sock.stats()['eagain']
+        self.sleep(0.1)
+        self.assertTrue(srv_sock._buffer)
+        self.assertLess(srv_sock.stats()['eagain'] - eagain, 5)
+
+        async def get_data(sock):
+            res = []
+            for _ in data:
+                res.append((await sock.recv()))
+            return res
+
+        self.assertEqual(
+            data, self.loop.run_until_complete(get_data(client_sock)))
+        self.assertTrue(all(fut.done() for fut in futs))
+        self.assertFalse(srv_sock._buffer)
+        self.assertFalse(srv_sock._fd_reader)
+
+
+class EpollLoopIntegrationalTests(CoreIntegrationalTests):
+    """Run integrational tests on loop with ZmqEpollSelector."""
+
+    def setUp(self):
+        self.loop = zmqtulip.ZmqEventLoop(zmqtulip.ZmqEpollSelector())
+        self.srv_ctx = zmqtulip.Context(loop=self.loop)
+        self.c_ctx = zmqtulip.Context(loop=self.loop)
+        tulip.set_event_loop(None)
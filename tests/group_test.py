@@ -0,0 +1,109 @@
+"""tests for group.py"""
+try:
+    import asyncio as tulip
+except ImportError:
+    import tulip
+import os
+import threading
+import unittest
+import zmq
+import zmqtulip
+
+
+class LoopGroupTests(unittest.TestCase):
+
+    def setUp(self):
+        self.group = zmqtulip.LoopGroup(2)
+        self.group.start()
+
+    def tearDown(self):
+        self.group.stop()
+
+    def test_start(self):
+        self.assertEqual(2, len(self.group))
+        self.assertEqual(2, len(set(map(id, self.group.loops))))
+        for loop in self.group.loops:
+            self.assertIsInstance(loop, zmqtulip.ZmqEventLoop)
+            self.assertTrue(loop.is_running())
+        for ctx, loop in zip(self.group.contexts, self.group.loops):
+            self.assertIs(loop, ctx._loop)
+            self.assertEqual(
+                self.group.context.underlying, ctx.underlying)
+
+        self.assertRaises(RuntimeError, self.group.start)
+
+    def test_submit(self):
+        def thread_name(ctx):
+            return threading.current_thread().name
+
+        names = [self.group.submit(thread_name).result(1.0)
+                 for _ in range(4)]
+        self.assertEqual(
+            ['zmqtulip-loop-0', 'zmqtulip-loop-1'] * 2, names)
+        self.assertEqual(
+            'zmqtulip-loop-1',
+            self.group.submit(thread_name, shard=1).result(1.0))
+
+        def fail(ctx):
+            raise ValueError()
+
+        self.assertRaises(
+            ValueError, self.group.submit(fail).result, 1.0)
+
+    def test_inproc_handoff(self):
+        def bind(ctx):
+            sock = ctx.socket(zmq.PULL)
+            sock.bind('inproc://group')
+            return sock.recv()
+
+        def send(ctx, data):
+            sock = ctx.socket(zmq.PUSH)
+            sock.connect('inproc://group')
+            return sock.send(data, copy=False)
+
+        recv = self.group.submit(bind, shard=0)
+        # future of send completes in loop thread
+        self.assertIsInstance(
+            self.group.submit(send, b'data', shard=1).result(1.0),
+            zmq.MessageTracker)
+        self.assertEqual(b'data', recv.result(1.0))
+
+    def test_coroutine(self):
+        async def sleep(ctx, delay):
+            await tulip.sleep(delay)
+            return ctx
+
+        self.assertIs(
+            self.group.contexts[1],
+            self.group.submit(sleep, 0.01, shard=1).result(1.0))
+
+    @unittest.skipUnless(
+        hasattr(os, 'sched_setaffinity'), 'requires sched_setaffinity')
+    def test_affinity(self):
+        cpu = min(os.sched_getaffinity(0))
+        group = zmqtulip.LoopGroup(2, affinity=[{cpu}, {cpu}])
+        group.start()
+        try:
+            res = group.broadcast(lambda ctx: os.sched_getaffinity(0))
+            self.assertEqual([{cpu}, {cpu}], [fut.result(1.0) for fut in res])
+        finally:
+            group.stop()
+
+        self.assertRaises(
+            ValueError, zmqtulip.LoopGroup, 2, affinity=[{cpu}])
+
+        group = zmqtulip.LoopGroup(1, affinity=[{4096}])
+        self.assertRaises(OSError, group.start)
+        group.context.term()
+
+    def test_start_error(self):
+        def loop_factory():
+            if threading.current_thread().name == 'zmqtulip-loop-1':
+                raise ValueError('loop')
+            return zmqtulip.ZmqEventLoop()
+
+        group = zmqtulip.LoopGroup(2, loop_factory=loop_factory)
+        self.assertRaises(ValueError, group.start)
+        self.assertEqual([None, None], group.loops)
+        self.assertFalse(group._threads)
+        group.context.term()
@@ -0,0 +1,70 @@
+"""tests for loop.py"""
+try:
+    import asyncio as tulip
+except ImportError:
+    import tulip
+import socket
+import unittest
+import unittest.mock
+import zmq
+import zmqtulip
+
+
+class ZmqEventLoopTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = zmqtulip.new_event_loop()
+        self.ctx = zmqtulip.Context(loop=self.loop)
+        tulip.set_event_loop(None)
+
+    def tearDown(self):
+        self.ctx.destroy(linger=0)
+        self.loop.close()
+
+    def test_new_event_loop(self):
+        self.assertIsInstance(self.loop, zmqtulip.ZmqEventLoop)
+        self.assertIsInstance(self.loop._selector, zmqtulip.ZmqSelector)
+
+        loop = zmqtulip.ZmqEventLoop(zmqtulip.ZmqEpollSelector())
+        self.assertIsInstance(loop._selector, zmqtulip.ZmqEpollSelector)
+        loop.close()
+
+    def test_dispatch(self):
+        push = self.ctx.socket(zmq.PUSH)
+        push.bind('ipc:///tmp/zmqtest')
+        pull = self.ctx.socket(zmq.PULL)
+        pull.connect('ipc:///tmp/zmqtest')
+
+        add_callback = self.loop._add_callback = unittest.mock.Mock(
+            wraps=self.loop._add_callback)
+        self.loop.call_later(0.05, push.send, b'data')
+        self.assertEqual(b'data', self.loop.run_until_complete(pull.recv()))
+
+        callbacks = [call[0][0]._callback
+                     for call in add_callback.call_args_list]
+        self.assertNotIn(pull._read_ready, callbacks)
+
+    def test_dispatch_fd(self):
+        rsock, wsock = socket.socketpair()
+        self.addCleanup(rsock.close)
+        self.addCleanup(wsock.close)
+
+        fut = tulip.Future(loop=self.loop)
+        self.loop.add_reader(rsock.fileno(), fut.set_result, None)
+        wsock.send(b'data')
+        self.loop.run_until_complete(fut)
+        self.loop.remove_reader(rsock.fileno())
+
+    def test_dispatch_exception(self):
+        handler = unittest.mock.Mock()
+        self.loop.set_exception_handler(handler)
+
+        sock = self.ctx.socket(zmq.PULL, persistent=True)
+        sock._read_ready = unittest.mock.Mock(side_effect=ValueError)
+        key = self.loop._selector.get_key(sock)
+
+        self.loop._process_events([(key, zmqtulip.selector.EVENT_READ)])
+        self.assertTrue(handler.called)
+        context = handler.call_args[0][1]
+        self.assertIs(sock, context['socket'])
+        self.assertIsInstance(context['exception'], ValueError)
@@ -0,0 +1,92 @@
+"""tests for poll.py"""
+try:
+    import asyncio as tulip
+except ImportError:
+    import tulip
+import unittest
+import zmq
+import zmqtulip
+
+
+class PollerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = zmqtulip.new_event_loop()
+        self.ctx = zmqtulip.Context(loop=self.loop)
+        self.zctx = zmq.Context()
+        tulip.set_event_loop(None)
+
+        self.push = self.ctx.socket(zmq.PUSH)
+        self.push.bind('ipc:///tmp/zmqtest')
+        self.pull1 = self.ctx.socket(zmq.PULL)
+        self.pull1.connect('ipc:///tmp/zmqtest')
+
+        self.pub = self.zctx.socket(zmq.PUB)
+        self.pub.bind('ipc:///tmp/zmqtest2')
+        self.sub = self.zctx.socket(zmq.SUB)
+        self.sub.setsockopt(zmq.SUBSCRIBE, b'')
+        self.sub.connect('ipc:///tmp/zmqtest2')
+
+        self.poller = zmqtulip.Poller(loop=self.loop)
+
+    def tearDown(self):
+        self.ctx.destroy(linger=0)
+        self.zctx.destroy(linger=0)
+        self.loop.close()
+
+    def poll(self, timeout=None):
+        return self.loop.run_until_complete(self.poller.poll(timeout))
+
+    def test_poll_timeout(self):
+        self.poller.register(self.pull1, zmq.POLLIN)
+        self.poller.register(self.sub, zmq.POLLIN)
+        self.assertEqual([], self.poll(0))
+        self.assertEqual([], self.poll(0.05))
+
+    def test_poll(self):
+        self.poller.register(self.pull1, zmq.POLLIN)
+        self.poller.register(self.sub, zmq.POLLIN)
+        self.poller.register(self.push, zmq.POLLOUT)
+        self.assertEqual([(self.push, zmq.POLLOUT)], self.poll())
+
+        self.poller.unregister(self.push)
+        self.loop.call_later(0.05, self.push.send, b'data')
+        self.assertEqual([(self.pull1, zmq.POLLIN)], self.poll(1.0))
+        self.assertEqual(
+            b'data', self.loop.run_until_complete(self.pull1.recv()))
+
+        self.loop.call_later(0.05, self.pub.send, b'data')
+        self.assertEqual([(self.sub, zmq.POLLIN)], self.poll(1.0))
+
+    def test_poll_pollout(self):
+        push = self.ctx.socket(zmq.PUSH)
+        push.bind('ipc:///tmp/zmqtest3')
+        pull = self.ctx.socket(zmq.PULL)
+
+        self.poller.register(push, zmq.POLLOUT)
+        self.assertEqual([], self.poll(0))
+        self.loop.call_later(0.05, pull.connect, 'ipc:///tmp/zmqtest3')
+        self.assertEqual([(push, zmq.POLLOUT)], self.poll(1.0))
+
+    def test_register(self):
+        self.poller.register(self.pull1, zmq.POLLIN)
+        self.assertTrue(self.pull1._reading)
+        self.assertEqual([self.poller._signal], self.pull1._watchers)
+
+        self.poller.modify(self.pull1, zmq.POLLIN | zmq.POLLOUT)
+        self.assertEqual(1, len(self.pull1._watchers))
+
+        self.poller.register(self.pull1, 0)
+        self.assertFalse(self.pull1._watchers)
+        self.assertFalse(self.pull1._reading)
+
+    def test_poll_twice(self):
+        self.poller.register(self.pull1, zmq.POLLIN)
+        task = tulip.Task(self.poller.poll(), loop=self.loop)
+        self.loop.call_later(0.01, task.cancel)
+        self.assertRaises(
+            RuntimeError, self.loop.run_until_complete,
+            self.poller.poll())
+        self.assertRaises(
+            tulip.CancelledError, self.loop.run_until_complete, task)
+        self.assertIsNone(self.poller._waiter)
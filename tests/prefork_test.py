@@ -0,0 +1,91 @@
+"""tests for prefork.py"""
+try:
+    import asyncio as tulip
+except ImportError:
+    import tulip
+import os
+import signal
+import time
+import unittest
+import zmqtulip
+
+
+def worker(w):
+    w.set_load(connections=w.idx)
+
+    def hello():
+        w.publish('hello {}'.format(w.idx).encode())
+        w.loop.call_later(0.05, hello)
+
+    def handler(data):
+        if data.startswith(b'hello') and data != b'hello 0':
+            w.publish(b'ack ' + data)
+
+    w.add_handler(handler)
+    hello()
+
+
+def busy_worker(w):
+    time.sleep(60)
+
+
+class PreforkServerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = zmqtulip.new_event_loop()
+        tulip.set_event_loop(None)
+        self.server = zmqtulip.PreforkServer(
+            worker, workers=2, port=0, heartbeat=0.05, timeout=2.0,
+            loop=self.loop)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        self.loop.close()
+
+    def run_until(self, predicate, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            self.assertLess(time.monotonic(), deadline, 'timeout')
+            fut = tulip.Future(loop=self.loop)
+            self.loop.call_later(0.01, fut.set_result, None)
+            self.loop.run_until_complete(fut)
+
+    def test_bus(self):
+        messages = set()
+        self.server.add_handler(messages.add)
+        self.run_until(lambda: b'ack hello 1' in messages)
+        self.assertIn(b'hello 0', messages)
+
+    def test_stats(self):
+        self.run_until(
+            lambda: all(info['stats'] for info in self.server.stats()))
+
+        stats = self.server.stats()
+        self.assertEqual(2, len(stats))
+        for idx, info in enumerate(stats):
+            self.assertEqual(0, info['restarts'])
+            self.assertEqual(info['pid'], info['stats']['pid'])
+            self.assertEqual({'connections': idx}, info['stats']['load'])
+
+    def test_restart(self):
+        pid = self.server.stats()[0]['pid']
+        os.kill(pid, signal.SIGKILL)
+
+        self.run_until(lambda: self.server.stats()[0]['stats'] and
+                       self.server.stats()[0]['pid'] != pid)
+        self.assertEqual(1, self.server.stats()[0]['restarts'])
+        self.assertEqual(0, self.server.stats()[1]['restarts'])
+
+    def test_stop_busy_worker(self):
+        server = zmqtulip.PreforkServer(
+            busy_worker, workers=1, port=0, kill_timeout=0.2, loop=self.loop)
+        server.start()
+        pid = server.stats()[0]['pid']
+        started = time.monotonic()
+        self.run_until(lambda: time.monotonic() - started > 0.1)
+
+        t0 = time.monotonic()
+        server.stop()
+        self.assertLess(time.monotonic() - t0, 2.0)
+        self.assertRaises(ProcessLookupError, os.kill, pid, 0)
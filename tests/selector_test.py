@@ -0,0 +1,184 @@
+"""tests for selector.py"""
+import socket
+import time
+import unittest
+import unittest.mock
+import zmq
+import zmqtulip
+from zmqtulip.selector import (ZmqSelector, ZmqEpollSelector,
+                               EVENT_READ, EVENT_WRITE)
+try:
+    from asyncio import unix_events
+except ImportError:
+    from tulip import unix_events
+
+
+class SelectorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.selector = ZmqSelector()
+        self.selector._poller = unittest.mock.Mock()
+        self.selector._poller.poll.return_value = []
+
+    def test_select_timeout_milliseconds(self):
+        self.selector.select(0.5)
+        self.selector._poller.poll.assert_called_with(500)
+
+    def test_select_timeout_round_up(self):
+        self.selector.select(0.0001)
+        self.selector._poller.poll.assert_called_with(1)
+
+        self.selector.select(0.0015)
+        self.selector._poller.poll.assert_called_with(2)
+
+    def test_select_no_timeout(self):
+        self.selector.select(None)
+        self.selector._poller.poll.assert_called_with(None)
+
+    def test_select_negative_timeout(self):
+        self.selector.select(-1)
+        self.selector._poller.poll.assert_called_with(0)
+
+    def test_select_precise(self):
+        selector = ZmqSelector(precise=True)
+        t0 = time.monotonic()
+        self.assertEqual(selector.select(0.0025), [])
+        self.assertGreaterEqual(time.monotonic() - t0, 0.0025)
+
+
+class SelectorLoopTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = zmqtulip.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_idle_loop_wakeups(self):
+        selector = self.loop._selector
+        select = selector.select
+        calls = []
+
+        def counting_select(timeout=None):
+            calls.append(timeout)
+            return select(timeout)
+
+        selector.select = counting_select
+        self.loop.call_later(0.2, self.loop.stop)
+        t0 = time.monotonic()
+        self.loop.run_forever()
+
+        self.assertGreaterEqual(time.monotonic() - t0, 0.2)
+        self.assertLess(len(calls), 10)
+
+
+class SelectorSocketTests(unittest.TestCase):
+
+    selector_class = ZmqSelector
+
+    def setUp(self):
+        self.ctx = zmq.Context()
+        self.selector = self.selector_class()
+
+    def tearDown(self):
+        self.selector.close()
+        self.ctx.destroy(linger=0)
+
+    def test_register_socket(self):
+        push = self.ctx.socket(zmq.PUSH)
+        push.bind('ipc:///tmp/zmqtest')
+        pull = self.ctx.socket(zmq.PULL)
+        pull.connect('ipc:///tmp/zmqtest')
+
+        key = self.selector.register(pull, EVENT_READ, 'data')
+        self.assertIs(key, self.selector.get_key(pull))
+        self.assertEqual(pull.getsockopt(zmq.FD), key.fd)
+        self.assertEqual([], self.selector.select(0.05))
+
+        push.send(b'data')
+        self.assertEqual([(key, EVENT_READ)], self.selector.select(1.0))
+        # level-triggered, socket stays ready until message is read
+        self.assertEqual([(key, EVENT_READ)], self.selector.select(0))
+
+        pull.recv()
+        self.assertEqual([], self.selector.select(0))
+
+        self.selector.unregister(pull)
+        pull.close()
+        self.assertRaises(ValueError, self.selector.get_key, pull)
+
+    def test_register_fd(self):
+        rsock, wsock = socket.socketpair()
+        self.addCleanup(rsock.close)
+        self.addCleanup(wsock.close)
+
+        key = self.selector.register(rsock, EVENT_READ)
+        self.assertEqual([], self.selector.select(0))
+        wsock.send(b'data')
+        self.assertEqual([(key, EVENT_READ)], self.selector.select(1.0))
+
+        self.selector.modify(rsock, EVENT_READ | EVENT_WRITE)
+        self.assertEqual(
+            [(self.selector.get_key(rsock), EVENT_READ | EVENT_WRITE)],
+            self.selector.select(1.0))
+
+    def test_loop(self):
+        loop = unix_events.SelectorEventLoop(selector=self.selector_class())
+        self.addCleanup(loop.close)
+        ctx = zmqtulip.Context(loop=loop)
+        self.addCleanup(ctx.destroy, linger=0)
+
+        push = ctx.socket(zmq.PUSH)
+        push.bind('ipc:///tmp/zmqtest')
+        pull = ctx.socket(zmq.PULL)
+        pull.connect('ipc:///tmp/zmqtest')
+        self.assertEqual(
+            self.selector_class is ZmqSelector, pull._level_triggered)
+
+        loop.call_later(0.05, push.send, b'data1')
+        self.assertEqual(b'data1', loop.run_until_complete(pull.recv()))
+        loop.call_later(0.05, push.send, b'data2')
+        self.assertEqual(b'data2', loop.run_until_complete(pull.recv()))
+
+    def test_loop_replace_reader(self):
+        loop = unix_events.SelectorEventLoop(selector=self.selector_class())
+        self.addCleanup(loop.close)
+
+        push = self.ctx.socket(zmq.PUSH)
+        push.bind('ipc:///tmp/zmqtest')
+        pull = self.ctx.socket(zmq.PULL)
+        pull.connect('ipc:///tmp/zmqtest')
+
+        calls = []
+        loop.add_reader(pull, calls.append, 1)
+        # only data of key changes, selector must dispatch to new reader
+        loop.add_reader(pull, calls.append, 2)
+
+        push.send(b'data')
+        loop.call_later(0.1, loop.stop)
+        loop.run_forever()
+        self.assertTrue(calls)
+        self.assertEqual({2}, set(calls))
+
+
+class EpollSelectorSocketTests(SelectorSocketTests):
+
+    selector_class = ZmqEpollSelector
+
+    def test_idle_fds(self):
+        socks = []
+        for _ in range(100):
+            socks.extend(socket.socketpair())
+        for sock in socks:
+            self.addCleanup(sock.close)
+            self.selector.register(sock, EVENT_READ)
+
+        select = self.selector._selector.select = unittest.mock.Mock(
+            wraps=self.selector._selector.select)
+        self.assertEqual([], self.selector.select(0.01))
+        select.assert_called_with(0.01)
+
+        socks[0].send(b'data')
+        self.assertEqual(
+            [(self.selector.get_key(socks[1]), EVENT_READ)],
+            self.selector.select(1.0))
@@ -0,0 +1,90 @@
+"""tests for serializers.py"""
+import random
+import unittest
+import zmqtulip
+from zmqtulip import serializers
+
+
+class SerializersTests(unittest.TestCase):
+
+    obj = {'name': 'test', 'values': [1, -2, 3.5, None, True, False],
+           'nested': {'key': ['a', 'b']}}
+
+    def test_roundtrip(self):
+        for name in ('pickle', 'json', 'marshal', 'packed'):
+            dumps, loads = zmqtulip.get_serializer(name)
+            data = dumps(self.obj)
+            self.assertIsInstance(data, bytes)
+            self.assertEqual(self.obj, loads(data))
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, zmqtulip.get_serializer, 'unknown')
+
+    def test_register(self):
+        zmqtulip.register_serializer('test', repr, eval)
+        try:
+            self.assertEqual((repr, eval), zmqtulip.get_serializer('test'))
+        finally:
+            del serializers._serializers['test']
+
+    def test_packed_types(self):
+        obj = [None, True, False, 0, 127, 128, -1, -32, -33,
+               2 ** 63 - 1, -2 ** 63, 2 ** 80, -2 ** 80, 1.5, '', 'x' * 31,
+               'x' * 32, 'unicode ☃', b'', b'\x00\xff', (1, (2,)), (),
+               [], list(range(16)), {}, dict.fromkeys(range(16)),
+               {1: 'int key', 'k': [b'v']}]
+        data = serializers.packed_dumps(obj)
+        self.assertEqual(obj, serializers.packed_loads(data))
+        self.assertEqual(
+            obj, serializers.packed_loads(memoryview(bytearray(data))))
+
+    def test_packed_size(self):
+        dumps = serializers.packed_dumps
+        self.assertEqual(b'\x05', dumps(5))
+        self.assertEqual(b'\xff', dumps(-1))
+        self.assertEqual(b'\xcb\x80\x02', dumps(128))
+        self.assertEqual(b'\xa3abc', dumps('abc'))
+        self.assertEqual(b'\x92\x01\xc0', dumps([1, None]))
+        self.assertEqual(b'\x81\xa1k\xc3', dumps({'k': True}))
+        self.assertLess(len(dumps(self.obj)),
+                        len(zmqtulip.get_serializer('json')[0](self.obj)))
+
+    def test_packed_errors(self):
+        self.assertRaises(TypeError, serializers.packed_dumps, {1, 2})
+        self.assertRaises(ValueError, serializers.packed_loads, b'')
+        self.assertRaises(ValueError, serializers.packed_loads, b'\xc1')
+        self.assertRaises(ValueError, serializers.packed_loads, b'\xc0\xc0')
+
+    def test_packed_invalid(self):
+        loads = serializers.packed_loads
+        nested = b'\x91' * 10000 + b'\xc0'
+        self.assertRaises(ValueError, loads, nested)
+        self.assertRaises(ValueError, loads, b'\xa5abc')
+        self.assertRaises(ValueError, loads, b'\xa1\xff')
+        self.assertRaises(ValueError, loads, b'\xc6\xff\xff\xff\xff\x0f\xc0')
+        self.assertRaises(ValueError, loads, b'\xcb' + b'\xff' * 20)
+
+        # unhashable map keys
+        self.assertRaises(ValueError, loads, b'\x81\x90\xc0')
+        self.assertRaises(ValueError, loads, b'\x81\xc7\x01\x80\xc0')
+
+    def test_packed_fuzz(self):
+        rnd = random.Random(0)
+        data = serializers.packed_dumps(
+            [self.obj, {(1, 'a'): b'x' * 10, 2 ** 70: (None, 1.5)},
+             'y' * 40, list(range(20))])
+        for _ in range(2000):
+            fuzzed = bytearray(data)
+            for _ in range(rnd.randint(1, 4)):
+                op = rnd.randrange(3)
+                idx = rnd.randrange(len(fuzzed) + 1)
+                if op == 0 and idx < len(fuzzed):
+                    fuzzed[idx] = rnd.randrange(256)
+                elif op == 1 and idx:
+                    del fuzzed[idx:]
+                else:
+                    fuzzed.insert(idx, rnd.randrange(0x80, 0xd0))
+            try:
+                serializers.packed_loads(bytes(fuzzed))
+            except ValueError:
+                pass
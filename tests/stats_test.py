@@ -0,0 +1,66 @@
+"""tests for stats.py"""
+import unittest
+from zmqtulip.stats import Counters, Histogram
+
+
+class HistogramTests(unittest.TestCase):
+
+    def test_empty(self):
+        hist = Histogram()
+        snapshot = hist.snapshot()
+        self.assertEqual(0, snapshot['count'])
+        self.assertEqual(0.0, snapshot['p99'])
+        self.assertEqual([], snapshot['buckets'])
+
+    def test_record(self):
+        hist = Histogram()
+        hist.record(0.0)
+        hist.record(0.000003)
+        hist.record(0.001)
+        hist.record(5000.0)
+
+        snapshot = hist.snapshot()
+        self.assertEqual(4, snapshot['count'])
+        self.assertEqual(5000.0, snapshot['max'])
+        self.assertEqual(
+            [(0.000001, 1), (0.000004, 1), (0.001024, 1), (None, 1)],
+            snapshot['buckets'])
+
+    def test_percentile(self):
+        hist = Histogram()
+        for i in range(99):
+            hist.record(0.0001)
+        hist.record(0.5)
+
+        self.assertEqual(0.000128, hist.percentile(50))
+        self.assertEqual(0.000128, hist.percentile(99))
+        self.assertEqual(0.5, hist.percentile(100))
+
+        hist.reset()
+        self.assertEqual(0, hist.snapshot()['count'])
+
+
+class CountersTests(unittest.TestCase):
+
+    def test_snapshot(self):
+        counters = Counters()
+        counters.messages_sent += 2
+        counters.peak_buffer = 5
+
+        snapshot = counters.snapshot()
+        self.assertEqual(2, snapshot['messages_sent'])
+        self.assertEqual(5, snapshot['peak_buffer'])
+        self.assertEqual(0, snapshot['eagain'])
+
+        counters.reset()
+        self.assertEqual(0, counters.snapshot()['messages_sent'])
+
+    def test_aggregate(self):
+        self.assertEqual(0, Counters.aggregate([])['messages_sent'])
+
+        total = Counters.aggregate([
+            {'messages_sent': 1, 'peak_buffer': 3, 'buffer': 1},
+            {'messages_sent': 2, 'peak_buffer': 7, 'buffer': 2}])
+        self.assertEqual(3, total['messages_sent'])
+        self.assertEqual(7, total['peak_buffer'])
+        self.assertEqual(3, total['buffer'])
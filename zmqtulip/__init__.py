@@ -1,14 +1,19 @@
 # This relies on each of the submodules having an __all__ variable.
 from .core import *
+from .group import *
+from .loop import *
+from .poll import *
+from .prefork import *
 from .selector import *
+from .serializers import *
+from .stats import *
 
-__all__ = ['new_event_loop'] + (core.__all__ + selector.__all__)
+__all__ = ['new_event_loop'] + (
+    core.__all__ + group.__all__ + loop.__all__ + poll.__all__ +
+    prefork.__all__ + selector.__all__ + serializers.__all__ +
+    stats.__all__)
 
 
 def new_event_loop():
     """Create new event loop with zmq selector."""
-    try:
-        from asyncio import unix_events
-    except ImportError:
-        from tulip import unix_events
-    return unix_events.SelectorEventLoop(selector=ZmqSelector())
+    return ZmqEventLoop()
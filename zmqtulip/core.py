@@ -1,85 +1,570 @@
 """Tulip compatibility with zeromq."""
-__all__ = ['Socket', 'Context']
+__all__ = ['Socket', 'Context', 'MessageStream']
 
 import collections
 import functools
+import heapq
+import itertools
 import pickle
+import threading
 import zmq
 
+from .selector import ZmqSelector
+from .serializers import get_serializer
+from .stats import Counters, Histogram
+
 try:
     import asyncio as tulip
 except ImportError:
     import tulip
 
 
+# pickled buffers smaller than this are sent in-band
+OOB_THRESHOLD = 64 * 1024
+
+# polling interval bounds for zero-copy send trackers
+TRACKER_MIN_DELAY = 0.001
+TRACKER_MAX_DELAY = 0.05
+
+# batch size of `async for` loop over socket
+ITER_PREFETCH = 64
+
+# tie breaker for operations with equal deadlines
+_timeout_ids = itertools.count()
+
+
 class Socket(zmq.Socket):
-    """Tulip's version of zmq.Socket"""
+    """Tulip's version of zmq.Socket
+
+    Several coroutines can wait on `recv()` of the same socket, messages
+    are delivered to them in FIFO order. By default socket registers
+    reader in event loop only while some coroutine waits for data.
+    With `persistent=True` reader stays registered until socket is
+    closed, this avoids selector register/unregister calls for every
+    blocked recv.
+
+    `async for` loop over socket yields message frames and receives
+    messages in batches, frames left over after loop exits are returned
+    in order by following recv calls of any kind.
+
+    `send_obj()` and `recv_obj()` use serializer selected with
+    `serializer` argument or `set_serializer()`, see `zmqtulip.serializers`.
+    """
 
     _loop = None
-    _sock_fd = None
+    _fileobj = None
+    _level_triggered = False
     _buffer = None
+    _buffer_size = 0
+    _max_messages = None
+    _max_bytes = None
+    _drain_waiters = None
+    _blocked_sends = None
+    _writing = False
+    _flush_handle = None
+    _flush_messages = None
+    _flush_bytes = None
+    _flush_time = None
+    _events_handle = None
+    _readahead = None
+    _recv_waiters = None
+    _reading = False
+    _fd_reader = False
+    _persistent = False
+    _watchers = ()
+    _dumps = None
+    _loads = None
+    _queue_hist = None
+    _recv_hist = None
+    _counters = None
+    _trackers = ()
+    _tracker_handle = None
+    _tracker_delay = TRACKER_MIN_DELAY
+    _timeouts = None
+    _timeouts_dead = 0
+    _timeout_handle = None
+    _timeout_at = None
+    _ts_queue = None
+    _ts_lock = None
+    _ts_scheduled = False
 
-    def __init__(self, context, socket_type, *, loop=None):
+    def __init__(self, context, socket_type, *, loop=None, persistent=False,
+                 serializer='pickle'):
         super().__init__(context, socket_type)
 
         if loop is None:
             loop = tulip.get_event_loop()
 
         self._loop = loop
+        self._counters = Counters()
         self._buffer = collections.deque()
-        self._sock_fd = self.getsockopt(zmq.FD)
+        self._drain_waiters = []
+        self._blocked_sends = collections.deque()
+        self._trackers = []
+        self._timeouts = []
+        self._recv_waiters = collections.deque()
+        self._readahead = collections.deque()
+        self._watchers = []
+        self._ts_queue = collections.deque()
+        self._ts_lock = threading.Lock()
+        if isinstance(getattr(loop, '_selector', None), ZmqSelector):
+            # zmq.Poller reports level-triggered socket events, there
+            # are no edges to miss. ZmqEpollSelector re-checks only
+            # sockets it has seen ready, operations of socket itself
+            # still may consume the edge, so sockets use zmq.FD there.
+            self._level_triggered = True
+            self._fileobj = self
+        else:
+            self._fileobj = self.getsockopt(zmq.FD)
+        self.set_serializer(serializer)
 
-    @tulip.coroutine
-    def recv(self, flags=0, copy=True, track=False):
+        # keep reader registered for whole socket lifetime
+        self._persistent = persistent
+        if persistent:
+            self._start_reading()
+
+    def close(self, linger=None):
+        # pending recv calls fail the same way as recv on closed socket
+        waiters, self._recv_waiters = self._recv_waiters, collections.deque()
+        for fut, *args in waiters or ():
+            if not fut.done():
+                fut.set_exception(zmq.ZMQError(zmq.ENOTSOCK))
+
+        # so do buffered sends and drain() calls
+        sends = self._blocked_sends or ()
+        if self._buffer:
+            sends = itertools.chain(self._buffer, sends)
+        for fut, *args in sends:
+            if not fut.done():
+                fut.set_exception(zmq.ZMQError(zmq.ENOTSOCK))
+        self._buffer = collections.deque()
+        self._buffer_size = 0
+        self._blocked_sends = collections.deque()
+        waiters, self._drain_waiters = self._drain_waiters, []
+        for fut in waiters or ():
+            if not fut.done():
+                fut.set_exception(zmq.ZMQError(zmq.ENOTSOCK))
+
+        self._stop_reading()
+        self._stop_writing()
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._events_handle is not None:
+            self._events_handle.cancel()
+            self._events_handle = None
+        if self._timeout_handle is not None:
+            self._timeout_handle.cancel()
+            self._timeout_handle = None
+        super().close(linger)
+
+    def recv(self, flags=0, copy=True, track=False, *, timeout=None):
+        """Receive a message, returns coroutine.
+
+        With `timeout` (seconds) raises TimeoutError if no message
+        arrives in time.
+        """
+        # hand out coroutine of _recv(), no extra frame for every call
+        return self._recv(zmq.Socket.recv, flags, copy, track, timeout)
+
+    def recv_multipart(self, flags=0, copy=True, track=False, *,
+                       timeout=None):
+        """Receive a multipart message, returns coroutine."""
+        return self._recv(_recv_multipart, flags, copy, track, timeout)
+
+    async def _recv(self, recv, flags, copy, track, timeout):
+        if self._readahead:
+            # messages taken by `async for` loop go first
+            return self._take_readahead(recv is _recv_multipart, copy)
+
+        counters = self._counters
         if flags & zmq.NOBLOCK:
-            return super().recv(flags, copy, track)
+            try:
+                data = recv(self, flags, copy, track)
+            finally:
+                self._check_events()
+            counters.messages_received += 1
+            counters.bytes_received += _nbytes(data)
+            return data
 
         # ensure the zmq.NOBLOCK flag is part of flags
         flags |= zmq.NOBLOCK
 
+        # messages go to waiters in FIFO order, do not jump the queue
+        waiters = self._recv_waiters
+        while waiters and waiters[0][0].done():
+            waiters.popleft()
+
         # Attempt to complete this operation indefinitely
-        try:
-            return zmq.Socket.recv(self, flags, copy, track)
-        except zmq.ZMQError as e:
-            if e.errno != zmq.EAGAIN:
-                raise
+        if not waiters:
+            try:
+                data = recv(self, flags, copy, track)
+            except zmq.ZMQError as e:
+                if e.errno != zmq.EAGAIN:
+                    raise
+                counters.eagain += 1
+            else:
+                counters.messages_received += 1
+                counters.bytes_received += _nbytes(data)
+                if self._recv_hist is not None:
+                    self._recv_hist.record(0.0)
+                self._check_events()
+                return data
 
         # defer to the event loop until we're notified the socket is readable
         fut = tulip.Future(loop=self._loop)
-        self._recv(fut, False, flags, copy, track)
-        return (yield from fut)
+        if self._recv_hist is not None:
+            fut.add_done_callback(
+                functools.partial(self._record_recv, self._loop.time()))
+        waiters.append((fut, recv, flags, copy, track))
+        self._start_reading()
+        # failed recv may have consumed the edge, reader may have been
+        # registered already for pending sends
+        self._check_events()
+        if timeout is not None:
+            self._add_timeout(fut, timeout)
+        return (await fut)
 
-    def _recv(self, fut, registered, *args):
-        if registered:
-            self._loop.remove_reader(self._sock_fd)
-        if fut.cancelled():
-            return
+    def _record_recv(self, started, fut):
+        if self._recv_hist is not None and not fut.cancelled():
+            self._recv_hist.record(self._loop.time() - started)
 
-        try:
-            data = super().recv(*args)
-        except zmq.ZMQError as exc:
-            if exc.errno != zmq.EAGAIN:
+    async def recv_many(self, max_messages=1000, max_bytes=None,
+                        flags=0, copy=True, track=False, *, timeout=None):
+        """Wait for a message, then drain all available messages.
+
+        Returns list of at most `max_messages` messages, draining stops
+        as soon as total size of received messages reaches `max_bytes`.
+        """
+        if max_messages < 1:
+            raise ValueError(
+                'max_messages must be positive: {!r}'.format(max_messages))
+
+        readahead = self._readahead
+        if readahead:
+            # messages taken by `async for` loop go first
+            messages = []
+            nbytes = 0
+            while (readahead and len(messages) < max_messages and
+                   (max_bytes is None or nbytes < max_bytes)):
+                msg = self._take_readahead(False, copy)
+                messages.append(msg)
+                nbytes += len(msg)
+            return messages
+
+        msg = await self._recv(
+            zmq.Socket.recv, flags, copy, track, timeout)
+        messages = [msg]
+        nbytes = len(msg)
+
+        flags |= zmq.NOBLOCK
+        while len(messages) < max_messages:
+            if max_bytes is not None and nbytes >= max_bytes:
+                break
+            if self._recv_waiters:
+                # leave the rest for other waiting coroutines
+                break
+            try:
+                msg = zmq.Socket.recv(self, flags, copy, track)
+            except zmq.ZMQError:
+                # EAGAIN or error, errors get reported by next recv call
+                break
+            messages.append(msg)
+            nbytes += len(msg)
+        self._check_events()
+
+        counters = self._counters
+        counters.messages_received += len(messages) - 1
+        counters.bytes_received += nbytes - len(messages[0])
+        return messages
+
+    def _start_reading(self):
+        if not self._reading:
+            self._reading = True
+            self._counters.reader_registrations += 1
+            if self._level_triggered:
+                self._loop.add_reader(self._fileobj, self._read_ready)
+            else:
+                self._update_fd_reader()
+
+    def _stop_reading(self):
+        if self._reading:
+            self._reading = False
+            if self._level_triggered:
+                self._loop.remove_reader(self._fileobj)
+            else:
+                self._update_fd_reader()
+
+    def _update_fd_reader(self):
+        # zmq.FD becomes readable on every change of socket state, single
+        # reader serves both directions. It is never registered as
+        # writer, regular selector reports it always writable.
+        registered = self._fd_reader
+        wanted = self._reading or self._writing
+        if wanted and not registered:
+            self._fd_reader = True
+            self._loop.add_reader(self._fileobj, self._handle_events)
+            # edge could have been consumed before registration
+            self._check_events()
+        elif registered and not wanted:
+            self._fd_reader = False
+            self._loop.remove_reader(self._fileobj)
+
+    def _handle_events(self):
+        events = self.getsockopt(zmq.EVENTS)
+        if self._reading and (events & zmq.POLLIN or self._watchers):
+            self._read_ready()
+        if self._writing and events & zmq.POLLOUT:
+            self._send_ready()
+
+    def _add_watcher(self, callback):
+        # watchers get notified about every socket readiness, reader
+        # stays registered while socket has watchers
+        self._watchers.append(callback)
+        self._start_reading()
+
+    def _remove_watcher(self, callback):
+        self._watchers.remove(callback)
+        if not self._recv_waiters:
+            self._maybe_stop_reading()
+
+    def _maybe_stop_reading(self):
+        if not (self._persistent or self._watchers):
+            self._stop_reading()
+        elif self._level_triggered:
+            # reader has to go away while unread messages are pending
+            if self.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                self._stop_reading()
+        else:
+            # nobody is waiting, reset zmq.FD edge without losing
+            # readiness of buffered messages
+            self._check_events()
+
+    def _read_ready(self):
+        for callback in self._watchers:
+            callback()
+
+        waiters = self._recv_waiters
+        received = False
+
+        while waiters:
+            fut, recv, *args = waiters[0]
+            if fut.done():
+                waiters.popleft()
+                continue
+
+            try:
+                data = recv(self, *args)
+            except zmq.ZMQError as exc:
+                if exc.errno == zmq.EAGAIN:
+                    self._counters.eagain += 1
+                    self._check_events()
+                    return
+                waiters.popleft()
+                fut.set_exception(exc)
+            except Exception as exc:
+                waiters.popleft()
                 fut.set_exception(exc)
+            else:
+                waiters.popleft()
+                fut.set_result(data)
+                received = True
+                self._counters.messages_received += 1
+                self._counters.bytes_received += _nbytes(data)
+
+        if received:
+            self._check_events()
+
+        self._maybe_stop_reading()
+
+    def send(self, data, flags=0, copy=True, track=False, *, timeout=None):
+        """Send a message, returns future.
+
+        `data` is bytes, zmq.Frame or any object supporting buffer
+        protocol (bytearray, memoryview, mmap, ...). With `copy=False`
+        message is sent without copying, buffered message keeps reference
+        to `data` until it gets passed to libzmq. With `copy=False` and
+        `track=True` future completes when libzmq releases `data`, future
+        result is zmq.MessageTracker. Buffered message is dropped and
+        future fails with TimeoutError if libzmq does not accept it
+        within `timeout` seconds.
+
+        Once send buffer reaches its limits (see `set_buffer_limits()`)
+        future waits for buffer capacity before message gets buffered,
+        with zmq.NOBLOCK flag zmq.Again is raised instead.
+        """
+        assert _is_buffer(data), repr(data)
+        if _nbytes(data) == 0:
+            # truth value of some buffers (numpy arrays) is ambiguous
+            return
+
+        if copy and not isinstance(data, (bytes, zmq.Frame)):
+            # caller may reuse mutable buffer as soon as send() returns
+            data = bytes(data)
+
+        fut = self._send(zmq.Socket.send, data, flags, copy, track, timeout)
+        if track and not copy:
+            fut = self._track(fut)
+        return fut
+
+    def send_multipart(self, msg_parts, flags=0, copy=True, track=False, *,
+                       timeout=None):
+        """Send a sequence of buffers as a multipart message, returns future.
+
+        Message parts are queued as one entry, parts of different
+        messages never interleave.
+        """
+        msg_parts = list(msg_parts)
+        assert msg_parts, 'empty multipart message'
+        for idx, part in enumerate(msg_parts):
+            assert _is_buffer(part), repr(part)
+            if copy and not isinstance(part, (bytes, zmq.Frame)):
+                msg_parts[idx] = bytes(part)
+
+        fut = self._send(
+            _send_multipart, msg_parts, flags, copy, track, timeout)
+        if track and not copy:
+            fut = self._track(fut)
+        return fut
+
+    def send_threadsafe(self, data, flags=0, copy=True):
+        """Send a message from thread other than event loop thread.
+
+        Messages from other threads are queued and sent in event loop
+        thread, loop is woken up at most once per batch of queued
+        messages. Failed sends are not reported back to the caller, they
+        are passed to loop exception handler and counted in
+        `threadsafe_errors` counter.
+        """
+        assert _is_buffer(data), repr(data)
+        if copy and not isinstance(data, (bytes, zmq.Frame)):
+            data = bytes(data)
+        self._submit_threadsafe(self.send, (data, flags, copy))
+
+    def send_multipart_threadsafe(self, msg_parts, flags=0, copy=True):
+        """Send multipart message from other thread."""
+        msg_parts = list(msg_parts)
+        assert msg_parts, 'empty multipart message'
+        for idx, part in enumerate(msg_parts):
+            assert _is_buffer(part), repr(part)
+            if copy and not isinstance(part, (bytes, zmq.Frame)):
+                msg_parts[idx] = bytes(part)
+        self._submit_threadsafe(self.send_multipart, (msg_parts, flags, copy))
+
+    def _submit_threadsafe(self, send, args):
+        # deque.append is thread-safe, flag under lock makes sure
+        # every batch gets exactly one wakeup
+        self._ts_queue.append((send, args))
+        with self._ts_lock:
+            if self._ts_scheduled:
+                return
+            self._ts_scheduled = True
+        self._loop.call_soon_threadsafe(self._flush_threadsafe)
+
+    def _flush_threadsafe(self):
+        self._counters.threadsafe_wakeups += 1
+        with self._ts_lock:
+            # messages queued from now on need new wakeup
+            self._ts_scheduled = False
+
+        queue = self._ts_queue
+        while queue:
+            send, args = queue.popleft()
+            if self.closed:
+                self._threadsafe_failed(zmq.ZMQError(zmq.ENOTSOCK))
+                continue
+            try:
+                fut = send(*args)
+            except Exception as exc:
+                # one bad message must not stall the rest of the batch
+                self._threadsafe_failed(exc)
+                continue
+            if fut is not None:
+                # nobody waits for this future
+                fut.add_done_callback(self._threadsafe_done)
+
+    def _threadsafe_done(self, fut):
+        if not fut.cancelled() and fut.exception() is not None:
+            self._threadsafe_failed(fut.exception())
+
+    def _threadsafe_failed(self, exc):
+        # sender is in other thread and does not see the error
+        self._counters.threadsafe_errors += 1
+        self._loop.call_exception_handler({
+            'message': 'Dropped message sent from other thread',
+            'exception': exc,
+            'socket': self,
+        })
+
+    def _track(self, fut):
+        # zmq.MessageTracker provides no notification, pending trackers
+        # are polled by single timer with exponential backoff
+        released = tulip.Future(loop=self._loop)
+
+        def sent(fut):
+            if released.cancelled():
                 return
-            self._loop.add_reader(self._sock_fd, self._recv, fut, True, *args)
-        except Exception as exc:
-            fut.set_exception(exc)
+            if fut.cancelled():
+                released.cancel()
+            elif fut.exception() is not None:
+                released.set_exception(fut.exception())
+            elif fut.result() is None or fut.result().done:
+                released.set_result(fut.result())
+            else:
+                self._trackers.append((fut.result(), released))
+                if self._tracker_delay > TRACKER_MIN_DELAY:
+                    self._tracker_delay = TRACKER_MIN_DELAY
+                    if self._tracker_handle is not None:
+                        self._tracker_handle.cancel()
+                        self._tracker_handle = None
+                if self._tracker_handle is None:
+                    self._tracker_handle = self._loop.call_later(
+                        self._tracker_delay, self._poll_trackers)
+
+        if fut.done():
+            sent(fut)
         else:
-            fut.set_result(data)
+            fut.add_done_callback(sent)
+        return released
 
-    def send(self, data, flags=0, copy=True, track=False):
-        assert isinstance(data, bytes), repr(data)
-        if not data:
-            return
+    def _poll_trackers(self):
+        self._tracker_handle = None
+
+        pending = []
+        for tracker, fut in self._trackers:
+            if fut.cancelled():
+                continue
+            if tracker.done:
+                fut.set_result(tracker)
+            else:
+                pending.append((tracker, fut))
+        self._trackers = pending
 
+        if pending:
+            self._tracker_delay = min(
+                self._tracker_delay * 2, TRACKER_MAX_DELAY)
+            self._tracker_handle = self._loop.call_later(
+                self._tracker_delay, self._poll_trackers)
+
+    def _send(self, send, data, flags, copy, track, timeout):
         fut = tulip.Future(loop=self._loop)
+        counters = self._counters
+        noblock = flags & zmq.NOBLOCK
+        bounded = self._max_messages is not None or self._max_bytes is not None
+        attempted = False
 
-        if not self._buffer:
+        if not self._buffer and not self._blocked_sends:
             # if we're given the NOBLOCK flag act as normal
-            # and let the EAGAIN get raised
-            if flags & zmq.NOBLOCK:
-                res = super().send(data, flags, copy, track)
+            # and let the EAGAIN get raised, bounded buffer
+            # takes the message instead
+            if noblock and not bounded:
+                try:
+                    res = send(self, data, flags, copy, track)
+                finally:
+                    self._check_events()
                 fut.set_result(res)
+                counters.messages_sent += 1
+                counters.bytes_sent += _nbytes(data)
                 return fut
 
             # ensure the zmq.NOBLOCK flag is part of flags
@@ -87,57 +572,632 @@ class Socket(zmq.Socket):
 
             # Attempt to complete this operation indefinitely
             try:
-                res = super().send(data, flags, copy, track)
-                fut.set_result(res)
-                return fut
+                res = send(self, data, flags, copy, track)
             except zmq.ZMQError as exc:
                 if exc.errno != zmq.EAGAIN:
                     fut.set_exception(exc)
-                    return
-
-            self._loop.add_writer(self._sock_fd, self._send_ready)
+                    self._check_events()
+                    return fut
+                counters.eagain += 1
+                attempted = True
+            else:
+                fut.set_result(res)
+                counters.messages_sent += 1
+                counters.bytes_sent += _nbytes(data)
+                self._check_events()
+                return fut
+        else:
+            flags |= zmq.NOBLOCK
 
-        self._buffer.append((fut, data, flags, copy, track))
+        nbytes = _nbytes(data)
+        queued = None if self._queue_hist is None else self._loop.time()
+        entry = (fut, send, (data, flags, copy, track), nbytes, queued)
+        if self._blocked_sends or self._is_full():
+            if noblock:
+                if attempted:
+                    self._check_events()
+                raise zmq.Again(zmq.EAGAIN)
+            # buffer is full, message waits for capacity in FIFO order
+            self._blocked_sends.append(entry)
+        else:
+            self._buffer_entry(entry)
+        if timeout is not None:
+            self._add_timeout(fut, timeout)
+        if attempted:
+            # failed send may have consumed the edge, reader may have
+            # been registered already for pending recv calls
+            self._check_events()
         return fut
 
+    def _buffer_entry(self, entry):
+        self._buffer.append(entry)
+        self._buffer_size += entry[3]
+        if len(self._buffer) > self._counters.peak_buffer:
+            self._counters.peak_buffer = len(self._buffer)
+        self._start_writing()
+
+    def _add_timeout(self, fut, timeout):
+        # all pending operations of socket share one timer,
+        # scheduled for the earliest deadline
+        deadline = self._loop.time() + timeout
+        entry = [deadline, next(_timeout_ids), fut]
+        heapq.heappush(self._timeouts, entry)
+        fut.add_done_callback(functools.partial(self._discard_timeout, entry))
+        if self._timeout_handle is None or deadline < self._timeout_at:
+            self._schedule_timeout()
+
+    def _discard_timeout(self, entry, fut):
+        # completed operation must not keep its result alive until
+        # deadline, heap is compacted once most of it is dead
+        if entry[2] is None:
+            return
+        entry[2] = None
+        self._timeouts_dead += 1
+        if self._timeouts_dead * 2 > len(self._timeouts):
+            self._timeouts = [
+                entry for entry in self._timeouts if entry[2] is not None]
+            heapq.heapify(self._timeouts)
+            self._timeouts_dead = 0
+            if not self._timeouts and self._timeout_handle is not None:
+                self._timeout_handle.cancel()
+                self._timeout_handle = None
+
+    def _schedule_timeout(self):
+        if self._timeout_handle is not None:
+            self._timeout_handle.cancel()
+            self._timeout_handle = None
+
+        timeouts = self._timeouts
+        while timeouts and timeouts[0][2] is None:
+            heapq.heappop(timeouts)
+            self._timeouts_dead -= 1
+        if timeouts:
+            self._timeout_at = timeouts[0][0]
+            self._timeout_handle = self._loop.call_at(
+                self._timeout_at, self._expire)
+
+    def _expire(self):
+        self._timeout_handle = None
+
+        # timers may fire slightly early, within clock resolution
+        now = self._loop.time() + 0.001
+        timeouts = self._timeouts
+        expired = False
+        while timeouts and timeouts[0][0] <= now:
+            entry = heapq.heappop(timeouts)
+            fut = entry[2]
+            if fut is None:
+                self._timeouts_dead -= 1
+                continue
+            # entry is gone from heap, done callback has nothing to do
+            entry[2] = None
+            if not fut.done():
+                fut.set_exception(tulip.TimeoutError())
+                expired = True
+
+        if expired:
+            self._purge()
+        self._schedule_timeout()
+
+    def _purge(self):
+        # drop expired operations, stop watching socket if nothing is left
+        waiters = self._recv_waiters
+        if waiters:
+            live = [waiter for waiter in waiters if not waiter[0].done()]
+            waiters.clear()
+            waiters.extend(live)
+            if not waiters and not self._persistent and not self._watchers:
+                self._stop_reading()
+
+        blocked = self._blocked_sends
+        if blocked:
+            live = [entry for entry in blocked if not entry[0].done()]
+            blocked.clear()
+            blocked.extend(live)
+
+        buffer = self._buffer
+        if buffer:
+            live = [entry for entry in buffer if not entry[0].done()]
+            buffer.clear()
+            buffer.extend(live)
+            self._buffer_size = sum(entry[3] for entry in live)
+            if not buffer and not blocked:
+                self._stop_writing()
+                if self._flush_handle is not None:
+                    self._flush_handle.cancel()
+                    self._flush_handle = None
+        self._wakeup_drain_waiters()
+
+    def _start_writing(self):
+        if not self._writing and self._flush_handle is None:
+            self._writing = True
+            self._counters.writer_registrations += 1
+            if self._level_triggered:
+                self._loop.add_writer(self._fileobj, self._send_ready)
+            else:
+                self._update_fd_reader()
+
+    def _stop_writing(self):
+        if self._writing:
+            self._writing = False
+            if self._level_triggered:
+                self._loop.remove_writer(self._fileobj)
+            else:
+                self._update_fd_reader()
+
     def _send_ready(self):
-        while self._buffer:
-            entry = self._buffer.popleft()
-            fut, *args = entry
+        for callback in self._watchers:
+            callback()
 
-            try:
-                res = super().send(*args)
+        self._flush_handle = None
+        buffer = self._buffer
+
+        max_messages = self._flush_messages
+        max_bytes = self._flush_bytes
+        deadline = None
+        if self._flush_time is not None:
+            deadline = self._loop.time() + self._flush_time
+        sent = sent_bytes = 0
+
+        try:
+            while buffer:
+                if ((max_messages is not None and sent >= max_messages) or
+                        (max_bytes is not None and sent_bytes >= max_bytes) or
+                        (deadline is not None and
+                         self._loop.time() >= deadline)):
+                    # flush budget is exhausted, give other callbacks
+                    # a chance and continue on next loop iteration
+                    self._stop_writing()
+                    self._flush_handle = self._loop.call_soon(
+                        self._send_ready)
+                    return
+
+                fut, send, args, nbytes, queued = buffer[0]
+                if fut.done():
+                    buffer.popleft()
+                    self._buffer_size -= nbytes
+                    continue
+
+                try:
+                    res = send(self, *args)
+                except zmq.ZMQError as exc:
+                    if exc.errno == zmq.EAGAIN:
+                        self._counters.eagain += 1
+                        self._start_writing()
+                        return
+                    buffer.popleft()
+                    self._buffer_size -= nbytes
+                    fut.set_exception(exc)
+                    continue
+                except Exception as exc:
+                    buffer.popleft()
+                    self._buffer_size -= nbytes
+                    fut.set_exception(exc)
+                    continue
+
+                buffer.popleft()
+                self._buffer_size -= nbytes
+                sent += 1
+                sent_bytes += nbytes
                 fut.set_result(res)
+                if queued is not None and self._queue_hist is not None:
+                    self._queue_hist.record(self._loop.time() - queued)
+
+            self._stop_writing()
+        finally:
+            self._counters.messages_sent += sent
+            self._counters.bytes_sent += sent_bytes
+            self._check_events()
+            self._wakeup_drain_waiters()
+
+    def _check_events(self, events=None):
+        # zmq.FD is edge-triggered and every operation on socket may
+        # consume the edge. Check zmq.EVENTS and process pending work
+        # on next loop iteration instead of waiting for the next edge.
+        if self._level_triggered or self._events_handle is not None:
+            return
+        if not (self._recv_waiters or self._buffer) or self.closed:
+            return
+
+        if events is None:
+            events = self.getsockopt(zmq.EVENTS)
+        if ((events & zmq.POLLIN and self._recv_waiters) or
+                (events & zmq.POLLOUT and self._buffer and
+                 self._flush_handle is None)):
+            self._events_handle = self._loop.call_soon(self._process_events)
+
+    def _process_events(self):
+        self._events_handle = None
+        if self._recv_waiters:
+            self._read_ready()
+        if self._buffer and self._flush_handle is None:
+            self._send_ready()
+
+    def set_flush_budget(self, max_messages=None, max_bytes=None,
+                         max_time=None):
+        """Limit amount of work done by one send buffer flush.
+
+        Flush stops after `max_messages` messages, `max_bytes` bytes
+        or `max_time` seconds, and continues on next loop iteration.
+        Without budget whole buffer is flushed in one callback.
+        """
+        self._flush_messages = max_messages
+        self._flush_bytes = max_bytes
+        self._flush_time = max_time
+
+    def set_buffer_limits(self, max_messages=None, max_bytes=None):
+        """Set limits for send buffer.
+
+        Buffer has no capacity once it holds `max_messages` messages or
+        `max_bytes` bytes. `send()` returns future which waits for
+        capacity then, or raises zmq.Again with zmq.NOBLOCK flag, and
+        `drain()` waits until buffer has capacity again. Without limits
+        buffer grows unbounded and `drain()` waits until it is empty.
+        """
+        for name, value in (('max_messages', max_messages),
+                            ('max_bytes', max_bytes)):
+            if value is not None and value < 1:
+                raise ValueError(
+                    '{} must be positive: {!r}'.format(name, value))
+
+        self._max_messages = max_messages
+        self._max_bytes = max_bytes
+        self._wakeup_drain_waiters()
+
+    def get_buffer_size(self):
+        """Return number of bytes in send buffer."""
+        return self._buffer_size
+
+    async def drain(self):
+        """Wait until send buffer has capacity."""
+        if self._has_capacity():
+            return
+        fut = tulip.Future(loop=self._loop)
+        self._drain_waiters.append(fut)
+        await fut
+
+    def _is_full(self):
+        return ((self._max_messages is not None and
+                 len(self._buffer) >= self._max_messages) or
+                (self._max_bytes is not None and
+                 self._buffer_size >= self._max_bytes))
+
+    def _has_capacity(self):
+        if self._max_messages is None and self._max_bytes is None:
+            return not self._buffer
+        return not self._blocked_sends and not self._is_full()
+
+    def _wakeup_drain_waiters(self):
+        # blocked sends take freed capacity first
+        blocked = self._blocked_sends
+        if blocked and not self._is_full():
+            while blocked and not self._is_full():
+                entry = blocked.popleft()
+                if not entry[0].done():
+                    self._buffer_entry(entry)
+            self._check_events()
+
+        if self._drain_waiters and self._has_capacity():
+            waiters, self._drain_waiters = self._drain_waiters, []
+            for fut in waiters:
+                if not fut.done():
+                    fut.set_result(None)
+
+    def send_pyobj(self, obj, flags=0, protocol=pickle.HIGHEST_PROTOCOL):
+        """Send a pickled object, returns future.
+
+        With pickle protocol 5 large out-of-band buffers (PickleBuffer,
+        numpy arrays) are sent as extra message parts without copying.
+        `recv_pyobj()` rebuilds objects on top of received frames.
+        """
+        if protocol < 5:
+            return self.send(pickle.dumps(obj, protocol), flags)
+
+        buffers = []
+
+        def buffer_callback(buf):
+            try:
+                view = buf.raw()
+            except BufferError:
+                return True  # not contiguous, serialize in-band
+            if view.nbytes < OOB_THRESHOLD:
+                return True
+            buffers.append(view)
+
+        data = pickle.dumps(obj, protocol, buffer_callback=buffer_callback)
+        if not buffers:
+            return self.send(data, flags)
+        return self.send_multipart([data] + buffers, flags, copy=False)
+
+    async def recv_pyobj(self, flags=0):
+        frames = await self._recv(_recv_multipart, flags, False, False, None)
+        if len(frames) == 1:
+            return pickle.loads(frames[0].bytes)
+        return pickle.loads(
+            frames[0].buffer, buffers=[frame.buffer for frame in frames[1:]])
+
+    def enable_histograms(self, enabled=True):
+        """Enable or disable latency histograms.
+
+        'send_queue' histogram tracks how long buffered messages wait
+        before libzmq accepts them, 'recv_wait' histogram tracks how long
+        `recv()` callers wait for messages.
+        """
+        if enabled:
+            if self._queue_hist is None:
+                self._queue_hist = Histogram()
+                self._recv_hist = Histogram()
+        else:
+            self._queue_hist = self._recv_hist = None
+
+    def histograms(self):
+        """Return snapshot of latency histograms, or None if disabled."""
+        if self._queue_hist is None:
+            return None
+        return {'send_queue': self._queue_hist.snapshot(),
+                'recv_wait': self._recv_hist.snapshot()}
+
+    def stats(self):
+        """Return snapshot of socket counters."""
+        stats = self._counters.snapshot()
+        stats['buffer'] = len(self._buffer)
+        stats['buffer_bytes'] = self._buffer_size
+        return stats
+
+    def set_serializer(self, name):
+        """Select serializer for `send_obj()` and `recv_obj()`."""
+        self._dumps, self._loads = get_serializer(name)
+
+    def send_obj(self, obj, flags=0):
+        """Send serialized object, returns future."""
+        return self.send(self._dumps(obj), flags)
+
+    async def recv_obj(self, flags=0):
+        data = await self._recv(zmq.Socket.recv, flags, True, False, None)
+        return self._loads(data)
+
+    def stream(self, prefetch=64, copy=True):
+        """Return `MessageStream` over messages of this socket."""
+        return MessageStream(self, prefetch, copy=copy)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        # whole messages are received in batches only while loop waits
+        # for them, loop leaves no pending recv behind. Frames left over
+        # by previous loop are returned by next loop or recv call.
+        readahead = self._readahead
+        if not readahead:
+            try:
+                msg = await self._recv(
+                    _recv_multipart, 0, False, False, None)
             except zmq.ZMQError as exc:
-                if exc.errno != zmq.EAGAIN:
-                    fut.set_exception(exc)
-                else:
-                    self._buffer.appendleft(entry)
-                return
-            except Exception as exc:
-                fut.set_exception(exc)
-                return
+                if exc.errno in (zmq.ENOTSOCK, zmq.ETERM):
+                    raise StopAsyncIteration
+                raise
+            readahead.append(msg)
+            self._read_ahead()
+        return self._take_readahead(False, True)
+
+    def _read_ahead(self):
+        readahead = self._readahead
+        counters = self._counters
+        while len(readahead) < ITER_PREFETCH and not self._recv_waiters:
+            try:
+                msg = _recv_multipart(self, zmq.NOBLOCK, False, False)
+            except zmq.ZMQError:
+                # EAGAIN or error, errors get reported by next recv call
+                break
+            readahead.append(msg)
+            counters.messages_received += 1
+            counters.bytes_received += _nbytes(msg)
+        self._check_events()
+
+    def _take_readahead(self, multipart, copy):
+        # read-ahead holds frames of whole messages, recv() takes single
+        # frame, recv_multipart() takes rest of the message
+        readahead = self._readahead
+        if multipart:
+            parts = readahead.popleft()
+        else:
+            parts = [readahead[0].pop(0)]
+            if not readahead[0]:
+                readahead.popleft()
+        if copy:
+            parts = [frame.bytes for frame in parts]
+        return parts if multipart else parts[0]
+
 
-        self._loop.remove_writer(self._sock_fd)
+class MessageStream:
+    """Stream of socket messages with read-ahead.
 
-    def recv_pyobj(self, flags=0):
-        s = yield from self.recv(flags)
-        return pickle.loads(s)
+    Stream keeps up to `prefetch` messages buffered, buffer is refilled
+    with `Socket.recv_many()` while consumer processes messages::
+
+        async for msg in sock.stream():
+            ...
+
+        stream = sock.stream()
+        while True:
+            msg = await stream.next()
+
+    Buffered messages are lost when stream gets closed.
+    """
+
+    def __init__(self, sock, prefetch=64, *, copy=True):
+        self._sock = sock
+        self._loop = sock._loop
+        self._prefetch = max(prefetch, 1)
+        self._copy = copy
+        self._messages = collections.deque()
+        self._getters = collections.deque()
+        self._fetch = None
+        self._exc = None
+
+    def next(self):
+        """Return future with next message."""
+        return self._next(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._messages:
+            # buffered message, return without allocating future
+            msg = self._messages.popleft()
+            self._fill()
+            return msg
+        return (await self._next(StopAsyncIteration))
+
+    def close(self):
+        """Stop read-ahead."""
+        if self._fetch is not None:
+            self._fetch.cancel()
+            self._fetch = None
+
+    def _next(self, stop_exc):
+        fut = tulip.Future(loop=self._loop)
+
+        if self._messages:
+            fut.set_result(self._messages.popleft())
+        elif self._exc is not None:
+            self._set_exception(fut, stop_exc)
+        elif self._sock.closed:
+            fut.set_exception(
+                zmq.ZMQError(zmq.ENOTSOCK) if stop_exc is None
+                else stop_exc())
+        else:
+            self._getters.append((fut, stop_exc))
+
+        self._fill()
+        return fut
+
+    def _set_exception(self, fut, stop_exc):
+        exc = self._exc
+        if (stop_exc is not None and isinstance(exc, zmq.ZMQError) and
+                exc.errno in (zmq.ENOTSOCK, zmq.ETERM)):
+            # socket got closed, end of stream
+            exc = stop_exc()
+        fut.set_exception(exc)
+
+    def _fill(self):
+        if (self._fetch is None and self._exc is None and
+                len(self._messages) <= self._prefetch // 2):
+            self._fetch = tulip.Task(
+                self._sock.recv_many(
+                    self._prefetch - len(self._messages), copy=self._copy),
+                loop=self._loop)
+            self._fetch.add_done_callback(self._fetched)
+
+    def _fetched(self, task):
+        if task is not self._fetch:
+            return
+        self._fetch = None
+
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self._exc = task.exception()
+        else:
+            self._messages.extend(task.result())
+
+        getters = self._getters
+        while getters:
+            fut, stop_exc = getters.popleft()
+            if fut.cancelled():
+                continue
+            if self._messages:
+                fut.set_result(self._messages.popleft())
+            elif self._exc is not None:
+                self._set_exception(fut, stop_exc)
+            else:
+                getters.appendleft((fut, stop_exc))
+                break
+
+        self._fill()
+
+
+def _recv_multipart(sock, flags, copy, track):
+    # parts of multipart message arrive atomically, once first part
+    # is received the rest is available without blocking
+    parts = [zmq.Socket.recv(sock, flags, copy, track)]
+    while sock.getsockopt(zmq.RCVMORE):
+        parts.append(zmq.Socket.recv(sock, flags, copy, track))
+    return parts
+
+
+def _send_multipart(sock, parts, flags, copy, track):
+    # libzmq either accepts first part or fails with EAGAIN,
+    # rest of the parts never block
+    for part in parts[:-1]:
+        zmq.Socket.send(sock, part, flags | zmq.SNDMORE, copy, track)
+    return zmq.Socket.send(sock, parts[-1], flags, copy, track)
+
+
+def _nbytes(data):
+    if isinstance(data, (bytes, zmq.Frame)):
+        return len(data)
+    if isinstance(data, list):
+        return sum(_nbytes(part) for part in data)
+    return memoryview(data).nbytes
+
+
+def _is_buffer(data):
+    if isinstance(data, (bytes, zmq.Frame)):
+        return True
+    try:
+        memoryview(data)
+    except TypeError:
+        return False
+    return True
 
 
 class Context(zmq.Context):
     """Replacement for `zmq.Context`.
 
-    Creates special version of Socket object."""
+    Creates special version of Socket object. `serializer` is default
+    serializer of created sockets."""
 
     _loop = None
     _socket_class = None
 
-    def __init__(self, io_threads=1, *, loop=None):
-        super().__init__(io_threads)
+    def __init__(self, io_threads=1, *, loop=None, serializer='pickle',
+                 shadow=0):
+        if shadow:
+            super().__init__(shadow=shadow)
+        else:
+            super().__init__(io_threads)
 
         if loop is None:
             loop = tulip.get_event_loop()
 
         self._loop = loop
-        self._socket_class = functools.partial(Socket, loop=loop)
+        self._socket_class = functools.partial(
+            Socket, loop=loop, serializer=serializer)
+
+    @classmethod
+    def shadow(cls, address, *, loop=None, serializer='pickle'):
+        """Shadow existing libzmq context, `address` is integer address
+        or zmq.Context.
+
+        Sockets of contexts which share libzmq context can talk
+        over inproc:// transport, each context may use its own loop.
+        Terminating shadow context terminates libzmq context.
+        """
+        if isinstance(address, zmq.Context):
+            address = address.underlying
+        return cls(loop=loop, serializer=serializer, shadow=address)
+
+    def _close_sockets(self, linger=None):
+        # zmq.Context tracks its sockets in weak set
+        for sock in list(self._sockets):
+            if not sock.closed:
+                sock.close(linger)
+
+    def stats(self):
+        """Return aggregated counters of all open sockets."""
+        sockets = [sock for sock in self._sockets if not sock.closed]
+        stats = Counters.aggregate(sock.stats() for sock in sockets)
+        stats['sockets'] = len(sockets)
+        return stats
@@ -0,0 +1,188 @@
+"""Group of event loops running in their own threads."""
+__all__ = ['LoopGroup']
+
+import concurrent.futures
+import functools
+import inspect
+import itertools
+import os
+import threading
+import zmq
+
+from .core import Context
+from .loop import ZmqEventLoop
+
+try:
+    import asyncio as tulip
+except ImportError:
+    import tulip
+
+
+class LoopGroup:
+    """Run `size` event loops, each one in its own thread.
+
+    Every loop gets its own `zmqtulip.Context`, all of them shadow one
+    libzmq context, so sockets of different loops exchange messages
+    over inproc:// transport (with `copy=False` without copying).
+    Sockets belong to the loop they are created in, use `submit()` to
+    create and use them in a loop thread::
+
+        def serve(ctx, addr):
+            sock = ctx.socket(zmq.PULL)
+            sock.connect(addr)
+            return handle(sock)  # coroutine runs in loop thread
+
+        group = LoopGroup(4, affinity=True)
+        group.start()
+        group.broadcast(serve, 'inproc://jobs')
+
+    `affinity` pins loop threads to cpus, `True` pins every loop to its
+    own cpu, sequence of cpu sets pins loop with the same index.
+    """
+
+    def __init__(self, size=None, *, affinity=None, io_threads=1,
+                 serializer='pickle', loop_factory=ZmqEventLoop):
+        if size is None:
+            size = os.cpu_count() or 1
+        if size < 1:
+            raise ValueError('size must be positive: {!r}'.format(size))
+
+        if affinity is not None:
+            if not hasattr(os, 'sched_setaffinity'):
+                raise RuntimeError(
+                    'cpu affinity is not supported on this platform')
+            if affinity is True:
+                cpus = sorted(os.sched_getaffinity(0))
+                affinity = [{cpus[idx % len(cpus)]} for idx in range(size)]
+            else:
+                affinity = [set(cpus) for cpus in affinity]
+                if len(affinity) != size:
+                    raise ValueError('affinity needs one cpu set per loop')
+
+        self._size = size
+        self._affinity = affinity
+        self._serializer = serializer
+        self._loop_factory = loop_factory
+        self._threads = []
+        self._shards = itertools.cycle(range(size))
+
+        self.context = zmq.Context(io_threads)
+        self.loops = [None] * size
+        self.contexts = [None] * size
+
+    def __len__(self):
+        return self._size
+
+    def start(self):
+        """Start loop threads, returns when all loops are running."""
+        if self._threads:
+            raise RuntimeError('LoopGroup is already started')
+
+        for idx in range(self._size):
+            started = threading.Event()
+            errors = []
+            thread = threading.Thread(
+                target=self._run, args=(idx, started, errors),
+                name='zmqtulip-loop-{}'.format(idx), daemon=True)
+            thread.start()
+            started.wait()
+            if errors:
+                # loops started so far are stopped, context stays usable
+                thread.join()
+                self._stop_loops()
+                self.loops = [None] * self._size
+                self.contexts = [None] * self._size
+                raise errors[0]
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop loops, close their sockets and terminate context."""
+        self._stop_loops()
+        self.context.term()
+
+    def _stop_loops(self):
+        for loop in self.loops:
+            if loop is not None and not loop.is_closed():
+                loop.call_soon_threadsafe(loop.stop)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, func, *args, shard=None):
+        """Call `func(context, *args)` in loop thread.
+
+        Loops are picked round robin unless `shard` index is given.
+        Returns concurrent.futures.Future, if `func` returns coroutine or
+        future, returned future completes with its result.
+        """
+        if not self._threads:
+            raise RuntimeError('LoopGroup is not started')
+        if shard is None:
+            shard = next(self._shards)
+
+        loop = self.loops[shard]
+        future = concurrent.futures.Future()
+        loop.call_soon_threadsafe(
+            self._call, loop, self.contexts[shard], future, func, args)
+        return future
+
+    def broadcast(self, func, *args):
+        """Call `func(context, *args)` in every loop, returns futures."""
+        return [self.submit(func, *args, shard=idx)
+                for idx in range(self._size)]
+
+    def _run(self, idx, started, errors):
+        loop = None
+        try:
+            if self._affinity is not None:
+                os.sched_setaffinity(0, self._affinity[idx])
+
+            loop = self._loop_factory()
+            tulip.set_event_loop(loop)
+            ctx = Context.shadow(
+                self.context, loop=loop, serializer=self._serializer)
+        except Exception as exc:
+            # start() re-raises error in calling thread
+            if loop is not None:
+                loop.close()
+            errors.append(exc)
+            started.set()
+            return
+
+        self.loops[idx] = loop
+        self.contexts[idx] = ctx
+        loop.call_soon(started.set)
+
+        try:
+            loop.run_forever()
+        finally:
+            # shadow context must not terminate shared libzmq context,
+            # sockets are closed in thread which owns them
+            ctx._close_sockets(linger=0)
+            loop.close()
+
+    def _call(self, loop, ctx, future, func, args):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            res = func(ctx, *args)
+        except Exception as exc:
+            future.set_exception(exc)
+            return
+
+        if not inspect.isawaitable(res):
+            future.set_result(res)
+            return
+
+        # futures of loop objects must not leave loop thread
+        task = tulip.ensure_future(res, loop=loop)
+        task.add_done_callback(functools.partial(_copy_result, future))
+
+
+def _copy_result(future, task):
+    if task.cancelled():
+        future.set_exception(concurrent.futures.CancelledError())
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
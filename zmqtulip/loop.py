@@ -0,0 +1,50 @@
+"""Event loop with direct dispatch of zmq socket events."""
+__all__ = ['ZmqEventLoop']
+
+from .core import Socket
+from .selector import ZmqSelector, EVENT_READ, EVENT_WRITE
+
+try:
+    from asyncio import unix_events
+except ImportError:
+    from tulip import unix_events
+
+
+class ZmqEventLoop(unix_events.SelectorEventLoop):
+    """Selector event loop which uses ZmqSelector by default.
+
+    Regular loop queues callback handle of every ready fd and runs it on
+    the same iteration. Events of zmqtulip sockets are dispatched to the
+    socket right away instead, everything else is processed as usual.
+    """
+
+    def __init__(self, selector=None):
+        if selector is None:
+            selector = ZmqSelector()
+        super().__init__(selector)
+
+    def _process_events(self, event_list):
+        other = []
+        for key, mask in event_list:
+            socket = key.fileobj
+            if not isinstance(socket, Socket):
+                other.append((key, mask))
+                continue
+
+            # socket registers reader and writer only while it is
+            # reading or writing, its flags are up to date even if
+            # previous handler changed registrations
+            try:
+                if mask & EVENT_READ and socket._reading:
+                    socket._read_ready()
+                if mask & EVENT_WRITE and socket._writing:
+                    socket._send_ready()
+            except Exception as exc:
+                self.call_exception_handler({
+                    'message': 'Exception in zmq socket event handler',
+                    'exception': exc,
+                    'socket': socket,
+                })
+
+        if other:
+            super()._process_events(other)
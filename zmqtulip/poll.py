@@ -0,0 +1,138 @@
+"""Asynchronous zmq socket poller."""
+__all__ = ['Poller']
+
+import zmq
+
+from .core import Socket
+
+try:
+    import asyncio as tulip
+except ImportError:
+    import tulip
+
+
+class Poller:
+    """Tulip's version of zmq.Poller.
+
+    Each registered socket is watched by single event loop registration
+    for whole time it stays registered. Readiness of all sockets is
+    checked once per loop iteration, no matter how many sockets
+    signaled.
+    """
+
+    def __init__(self, *, loop=None):
+        if loop is None:
+            loop = tulip.get_event_loop()
+
+        self._loop = loop
+        self._sockets = {}
+        self._waiter = None
+        self._check_handle = None
+
+    def register(self, socket, flags=zmq.POLLIN | zmq.POLLOUT):
+        """Register zmq socket for polling.
+
+        Registering socket again modifies flags, socket with
+        flags 0 gets unregistered.
+        """
+        if not flags:
+            if socket in self._sockets:
+                self.unregister(socket)
+            return
+
+        if socket not in self._sockets:
+            if isinstance(socket, Socket):
+                socket._add_watcher(self._signal)
+            else:
+                self._loop.add_reader(
+                    socket.getsockopt(zmq.FD), self._fd_ready, socket)
+        self._sockets[socket] = flags
+
+    modify = register
+
+    def unregister(self, socket):
+        """Remove socket from poller."""
+        del self._sockets[socket]
+        if isinstance(socket, Socket):
+            socket._remove_watcher(self._signal)
+        elif not socket.closed:
+            self._loop.remove_reader(socket.getsockopt(zmq.FD))
+
+    async def poll(self, timeout=None):
+        """Wait until registered sockets are ready.
+
+        Returns list of (socket, events) tuples, empty list if nothing
+        got ready within `timeout` seconds.
+        """
+        if self._waiter is not None:
+            raise RuntimeError('Poller is already polling')
+
+        ready = self._ready()
+        if ready or (timeout is not None and timeout <= 0):
+            return ready
+
+        for socket, flags in self._sockets.items():
+            if isinstance(socket, Socket) and socket._level_triggered:
+                # level-triggered socket is not watched for POLLOUT and
+                # drops its reader while unread messages are pending
+                if flags & zmq.POLLIN:
+                    socket._start_reading()
+                if flags & zmq.POLLOUT:
+                    socket._start_writing()
+
+        self._waiter = tulip.Future(loop=self._loop)
+        handle = None
+        if timeout is not None:
+            handle = self._loop.call_later(timeout, self._timeout)
+        try:
+            return (await self._waiter)
+        finally:
+            self._waiter = None
+            if handle is not None:
+                handle.cancel()
+            if self._check_handle is not None:
+                self._check_handle.cancel()
+                self._check_handle = None
+
+    def _ready(self):
+        ready = []
+        for socket, flags in self._sockets.items():
+            events = socket.getsockopt(zmq.EVENTS)
+            if isinstance(socket, Socket):
+                # reading zmq.EVENTS resets zmq.FD edge,
+                # let socket handle its own pending operations
+                socket._check_events(events)
+                if socket._buffer:
+                    # new messages get queued behind buffered ones
+                    events &= ~zmq.POLLOUT
+            events &= flags
+            if events:
+                ready.append((socket, events))
+        return ready
+
+    def _fd_ready(self, socket):
+        if self._waiter is None:
+            # nobody is polling, just reset zmq.FD edge
+            socket.getsockopt(zmq.EVENTS)
+        else:
+            self._signal()
+
+    def _signal(self):
+        if self._waiter is not None and self._check_handle is None:
+            self._check_handle = self._loop.call_soon(self._check)
+
+    def _check(self):
+        self._check_handle = None
+        if self._waiter is None or self._waiter.done():
+            return
+        try:
+            ready = self._ready()
+        except Exception as exc:
+            self._waiter.set_exception(exc)
+        else:
+            if ready:
+                self._waiter.set_result(ready)
+
+    def _timeout(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result([])
@@ -0,0 +1,333 @@
+"""Prefork multiprocess server."""
+__all__ = ['PreforkServer', 'Worker']
+
+import json
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+import traceback
+import zmq
+
+from .core import Context
+from .loop import ZmqEventLoop
+
+try:
+    import asyncio as tulip
+except ImportError:
+    import tulip
+
+
+class Worker:
+    """Worker process of `PreforkServer`.
+
+    Worker function gets it as the only argument. `sock` is shared
+    listening socket, `loop` and `context` are event loop and
+    `zmqtulip.Context` of worker process.
+
+    Messages passed to `publish()` during one loop iteration go to
+    supervisor as one batch, supervisor broadcasts batches to all
+    other workers and their handlers get called for every message.
+    """
+
+    def __init__(self, idx, sock, up_addr, down_addr, heartbeat):
+        self.idx = idx
+        self.pid = os.getpid()
+        self.sock = sock
+        self.loop = ZmqEventLoop()
+        self.context = Context(loop=self.loop)
+        self.published = 0
+        self.received = 0
+
+        self._started = time.monotonic()
+        self._ppid = os.getppid()
+        self._heartbeat = heartbeat
+        self._handlers = []
+        self._pending = []
+        self._flush_handle = None
+        self._load = {}
+        self._id = str(self.pid).encode()
+
+        self._up = self.context.socket(zmq.PUSH)
+        self._up.connect(up_addr)
+        self._down = self.context.socket(zmq.SUB)
+        self._down.setsockopt(zmq.SUBSCRIBE, b'')
+        self._down.connect(down_addr)
+
+    def publish(self, data):
+        """Broadcast bytes to all other workers."""
+        self._pending.append(data)
+        if self._flush_handle is None:
+            self._flush_handle = self.loop.call_soon(self._flush)
+
+    def add_handler(self, callback):
+        """Call `callback(data)` for messages published by other workers."""
+        self._handlers.append(callback)
+
+    def remove_handler(self, callback):
+        self._handlers.remove(callback)
+
+    def set_load(self, **values):
+        """Set application load values reported in worker stats."""
+        self._load.update(values)
+
+    def stats(self):
+        """Return worker load stats."""
+        return {'pid': self.pid,
+                'uptime': time.monotonic() - self._started,
+                'cpu': time.process_time(),
+                'published': self.published,
+                'received': self.received,
+                'load': dict(self._load),
+                'sockets': self.context.stats()}
+
+    def run(self, func):
+        """Run worker function and event loop until supervisor exits."""
+        tulip.set_event_loop(self.loop)
+        self.loop.add_signal_handler(signal.SIGTERM, self.loop.stop)
+
+        res = func(self)
+        if tulip.iscoroutine(res):
+            tulip.Task(res, loop=self.loop)
+        tulip.Task(self._receive(), loop=self.loop)
+        self._send_stats()
+
+        try:
+            self.loop.run_forever()
+        finally:
+            self.context.destroy(linger=0)
+
+    def _flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, []
+        self.published += len(pending)
+        self._up.send_multipart([b'msg', self._id] + pending)
+
+    async def _receive(self):
+        while True:
+            frames = await self._down.recv_multipart()
+            if frames[1] == self._id:
+                continue
+            self.received += len(frames) - 2
+            for data in frames[2:]:
+                for callback in self._handlers:
+                    callback(data)
+
+    def _send_stats(self):
+        if os.getppid() != self._ppid:
+            # supervisor is gone
+            self.loop.stop()
+            return
+
+        self._up.send_multipart(
+            [b'stats', self._id, json.dumps(self.stats()).encode()])
+        self.loop.call_later(self._heartbeat, self._send_stats)
+
+
+class PreforkServer:
+    """Supervisor of `workers` processes sharing one listening socket.
+
+    Each worker process calls `worker(w)` with its `Worker` and runs
+    its own event loop; coroutine returned by `worker` runs as a task.
+    Workers talk to each other through supervisor over zmq bus, send
+    load stats every `heartbeat` seconds, and are restarted when they
+    exit or stay silent for `timeout` seconds. On shutdown workers get
+    SIGTERM and are killed when they do not exit in `kill_timeout`
+    seconds.
+
+    Listening socket is bound to `host` and `port` unless `sock` is
+    given.
+    """
+
+    def __init__(self, worker, *, workers=2, host='127.0.0.1', port=8080,
+                 sock=None, backlog=1024, heartbeat=5.0, timeout=15.0,
+                 kill_timeout=5.0, loop=None):
+        if loop is None:
+            loop = tulip.get_event_loop()
+
+        self.loop = loop
+        self.sock = sock
+        self._worker = worker
+        self._size = workers
+        self._host = host
+        self._port = port
+        self._backlog = backlog
+        self._heartbeat = heartbeat
+        self._timeout = timeout
+        self._kill_timeout = kill_timeout
+        self._workers = []
+        self._handlers = []
+        self._tmpdir = None
+        self._context = None
+        self._forward_task = None
+        self._check_handle = None
+        self._own_sock = False
+
+    def start(self):
+        """Bind socket, start bus and fork worker processes."""
+        if self.sock is None:
+            sock = socket.socket()
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((self._host, self._port))
+            sock.listen(self._backlog)
+            sock.setblocking(False)
+            self.sock = sock
+            self._own_sock = True
+
+        self._tmpdir = tempfile.mkdtemp(prefix='zmqtulip-')
+        self._up_addr = 'ipc://{}/up'.format(self._tmpdir)
+        self._down_addr = 'ipc://{}/down'.format(self._tmpdir)
+
+        self._context = Context(loop=self.loop)
+        self._up = self._context.socket(zmq.PULL)
+        self._up.bind(self._up_addr)
+        self._down = self._context.socket(zmq.PUB)
+        self._down.bind(self._down_addr)
+
+        for idx in range(self._size):
+            self._workers.append(
+                {'pid': None, 'restarts': -1, 'seen': None, 'stats': None})
+            self._spawn(idx)
+
+        self._forward_task = tulip.Task(self._forward(), loop=self.loop)
+        self._check_handle = self.loop.call_later(
+            self._heartbeat, self._check)
+
+    def stop(self):
+        """Terminate worker processes and close bus."""
+        if self._check_handle is not None:
+            self._check_handle.cancel()
+            self._check_handle = None
+        if self._forward_task is not None:
+            self._forward_task.cancel()
+            self._forward_task = None
+
+        self._kill([info['pid'] for info in self._workers])
+        self._workers = []
+
+        if self._context is not None:
+            self._context.destroy(linger=0)
+            self._context = None
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+        if self._own_sock:
+            self.sock.close()
+            self.sock = None
+            self._own_sock = False
+
+    def run_forever(self):
+        """Start server and run supervisor loop until SIGINT or SIGTERM."""
+        self.start()
+        self.loop.add_signal_handler(signal.SIGINT, self.loop.stop)
+        self.loop.add_signal_handler(signal.SIGTERM, self.loop.stop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.stop()
+
+    def add_handler(self, callback):
+        """Call `callback(data)` for every message published by workers."""
+        self._handlers.append(callback)
+
+    def remove_handler(self, callback):
+        self._handlers.remove(callback)
+
+    def stats(self):
+        """Return list of worker stats, one dict per worker slot."""
+        return [{'pid': info['pid'],
+                 'restarts': info['restarts'],
+                 'stats': info['stats']} for info in self._workers]
+
+    def _spawn(self, idx):
+        info = self._workers[idx]
+        info['restarts'] += 1
+        info['seen'] = self.loop.time()
+        info['stats'] = None
+
+        pid = os.fork()
+        if pid:
+            info['pid'] = pid
+            return
+
+        # child, never returns to the caller
+        try:
+            # signals should not wake up supervisor loop
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            # supervisor handler would drop SIGTERM until worker
+            # installs its own
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            tulip.set_event_loop(None)
+
+            worker = Worker(idx, self.sock, self._up_addr, self._down_addr,
+                            self._heartbeat)
+            worker.run(self._worker)
+        except BaseException:
+            traceback.print_exc()
+            os._exit(1)
+        os._exit(0)
+
+    def _kill(self, pids, sig=signal.SIGTERM):
+        pending = set()
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except OSError:
+                continue
+            pending.add(pid)
+
+        # worker busy in synchronous code does not handle SIGTERM,
+        # it gets killed once grace period is over
+        deadline = time.monotonic() + self._kill_timeout
+        while pending:
+            for pid in list(pending):
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0]:
+                        pending.discard(pid)
+                except OSError:
+                    pending.discard(pid)
+            if not pending:
+                break
+            if time.monotonic() >= deadline:
+                for pid in pending:
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                        os.waitpid(pid, 0)
+                    except OSError:
+                        pass
+                break
+            time.sleep(0.01)
+
+    async def _forward(self):
+        while True:
+            frames = await self._up.recv_multipart()
+            kind, pid = frames[0], int(frames[1])
+            if kind == b'msg':
+                # batch goes to all workers as one message
+                self._down.send_multipart(frames)
+                for data in frames[2:]:
+                    for callback in self._handlers:
+                        callback(data)
+            elif kind == b'stats':
+                for info in self._workers:
+                    if info['pid'] == pid:
+                        info['seen'] = self.loop.time()
+                        info['stats'] = json.loads(frames[2].decode())
+
+    def _check(self):
+        now = self.loop.time()
+        for idx, info in enumerate(self._workers):
+            try:
+                exited = os.waitpid(info['pid'], os.WNOHANG)[0]
+            except OSError:
+                exited = True
+            if exited or now - info['seen'] > self._timeout:
+                if not exited:
+                    self._kill([info['pid']], signal.SIGKILL)
+                self._spawn(idx)
+
+        self._check_handle = self.loop.call_later(
+            self._heartbeat, self._check)
@@ -1,22 +1,54 @@
 """ZMQ pooler for Tulip."""
-__all__ = ['ZmqSelector']
+__all__ = ['ZmqSelector', 'ZmqEpollSelector']
+import math
+import time
 import zmq
 from zmq import ZMQError, POLLIN, POLLOUT, POLLERR
-try:
-    from asyncio.selectors import BaseSelector, EVENT_READ, EVENT_WRITE
-except ImportError:
-    from tulip.selectors import BaseSelector, EVENT_READ, EVENT_WRITE
+# selectors.BaseSelector is abstract, key bookkeeping lives
+# in _BaseSelectorImpl
+from selectors import _BaseSelectorImpl as BaseSelector
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
 
 
 EVENT_ALL = EVENT_READ | EVENT_WRITE
 
 
-class ZmqSelector(BaseSelector):
-    """A selector that can be used with tulip's selector base event loops."""
+class _BaseZmqSelector(BaseSelector):
+    """Selector which accepts zmq.Socket objects besides file objects."""
 
     def __init__(self):
+        super().__init__()
+        # registered zmq sockets, socket -> fd. Keys are looked up by fd,
+        # modify() replaces key when only its data changes.
+        self._sockets = {}
+
+    def _fileobj_lookup(self, fileobj):
+        if isinstance(fileobj, zmq.Socket):
+            if fileobj in self._sockets:
+                return self._sockets[fileobj]
+            if fileobj.closed:
+                raise ValueError('Invalid file object: {!r}'.format(fileobj))
+            return fileobj.getsockopt(zmq.FD)
+        return super()._fileobj_lookup(fileobj)
+
+
+class ZmqSelector(_BaseZmqSelector):
+    """A selector that can be used with tulip's selector base event loops.
+
+    zmq.Poller works with millisecond timeouts, event loop passes seconds.
+    By default timeout is rounded up to the next millisecond, so loop never
+    wakes up before its earliest timer is due. With `precise=True` selector
+    polls for whole milliseconds and then spins for the sub-millisecond
+    remainder, which gives accurate timers at the cost of some cpu.
+
+    zmq.Socket objects are registered with zmq.Poller as sockets, not by
+    their zmq.FD, so selector reports level-triggered POLLIN/POLLOUT.
+    """
+
+    def __init__(self, *, precise=False):
         super().__init__()
         self._poller = zmq.Poller()
+        self._precise = precise
 
     def register(self, fileobj, events, data=None):
         key = super().register(fileobj, events, data)
@@ -26,21 +58,43 @@ class ZmqSelector(BaseSelector):
             z_events |= POLLIN
         if events & EVENT_WRITE:
             z_events |= POLLOUT
-        self._poller.register(key.fd, z_events)
+
+        if isinstance(fileobj, zmq.Socket):
+            self._sockets[fileobj] = key.fd
+            self._poller.register(fileobj, z_events)
+        else:
+            self._poller.register(key.fd, z_events)
 
         return key
 
     def unregister(self, fileobj):
         key = super().unregister(fileobj)
-        self._poller.unregister(key.fd)
+        if isinstance(key.fileobj, zmq.Socket):
+            del self._sockets[key.fileobj]
+            self._poller.unregister(key.fileobj)
+        else:
+            self._poller.unregister(key.fd)
         return key
 
     def select(self, timeout=None):
-        timeout = None if timeout is None else max(timeout, 0)
+        deadline = None
+        if timeout is None:
+            z_timeout = None
+        elif timeout <= 0:
+            z_timeout = 0
+        elif self._precise:
+            deadline = time.monotonic() + timeout
+            z_timeout = math.floor(timeout * 1000)
+        else:
+            z_timeout = math.ceil(timeout * 1000)
 
         ready = []
         try:
-            z_events = self._poller.poll(timeout)
+            z_events = self._poller.poll(z_timeout)
+            while not z_events and deadline is not None:
+                if time.monotonic() >= deadline:
+                    break
+                z_events = self._poller.poll(0)
         except ZMQError:
             return ready
 
@@ -53,8 +107,102 @@ class ZmqSelector(BaseSelector):
             if evt & POLLERR:
                 events = EVENT_ALL
 
+            if isinstance(fd, zmq.Socket):
+                fd = self._sockets.get(fd)
             key = self._key_from_fd(fd)
             if key:
                 ready.append((key, events & key.events))
 
         return ready
+
+
+class ZmqEpollSelector(_BaseZmqSelector):
+    """A selector backed by epoll (or best selector available on platform).
+
+    zmq.Poller is poll(2) underneath, every select() costs O(registered
+    fds). This selector keeps plain fds and zmq.FD of zmq sockets in epoll,
+    so select() costs O(ready fds) no matter how many idle connections are
+    registered.
+
+    zmq.FD is edge-triggered and signals both directions. Signaled zmq
+    sockets are checked with zmq.EVENTS, and sockets reported ready are
+    checked again on next select(), so zmq sockets get the same
+    level-triggered events as with ZmqSelector.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._selector = DefaultSelector()
+        # fds of zmq sockets which have to be checked with zmq.EVENTS
+        self._pending = set()
+
+    def register(self, fileobj, events, data=None):
+        key = super().register(fileobj, events, data)
+
+        if isinstance(fileobj, zmq.Socket):
+            self._sockets[fileobj] = key.fd
+            self._selector.register(key.fd, EVENT_READ)
+            # edge could have been consumed before registration
+            self._pending.add(key.fd)
+        else:
+            self._selector.register(key.fd, events)
+
+        return key
+
+    def unregister(self, fileobj):
+        key = super().unregister(fileobj)
+        self._selector.unregister(key.fd)
+        if isinstance(key.fileobj, zmq.Socket):
+            del self._sockets[key.fileobj]
+            self._pending.discard(key.fd)
+        return key
+
+    def close(self):
+        self._selector.close()
+        self._sockets.clear()
+        self._pending.clear()
+        super().close()
+
+    def select(self, timeout=None):
+        ready = {}
+        pending = self._pending
+        for fd in list(pending):
+            events = self._socket_events(fd)
+            if events:
+                ready[fd] = events
+            else:
+                pending.discard(fd)
+
+        if ready:
+            timeout = 0
+
+        for s_key, events in self._selector.select(timeout):
+            fd = s_key.fd
+            if fd in ready:
+                continue
+            key = self._key_from_fd(fd)
+            if key is None:
+                continue
+            if isinstance(key.fileobj, zmq.Socket):
+                events = self._socket_events(fd)
+                if events:
+                    pending.add(fd)
+            if events:
+                ready[fd] = events
+
+        return [(self._key_from_fd(fd), events)
+                for fd, events in ready.items()]
+
+    def _socket_events(self, fd):
+        key = self._key_from_fd(fd)
+        try:
+            z_events = key.fileobj.getsockopt(zmq.EVENTS)
+        except ZMQError:
+            return key.events
+
+        events = 0
+        if z_events & POLLIN:
+            events |= EVENT_READ
+        if z_events & POLLOUT:
+            events |= EVENT_WRITE
+        return events & key.events
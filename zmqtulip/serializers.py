@@ -0,0 +1,221 @@
+"""Serializers for `Socket.send_obj()` and `Socket.recv_obj()`.
+
+Built-in serializers are 'pickle', 'json', 'marshal' and 'packed'.
+"""
+__all__ = ['register_serializer', 'get_serializer']
+
+import json
+import marshal
+import pickle
+import struct
+
+_serializers = {}
+
+
+def register_serializer(name, dumps, loads):
+    """Register serializer.
+
+    `dumps(obj)` returns bytes, `loads(data)` rebuilds object from bytes.
+    """
+    _serializers[name] = (dumps, loads)
+
+
+def get_serializer(name):
+    """Return (dumps, loads) pair of registered serializer."""
+    try:
+        return _serializers[name]
+    except KeyError:
+        raise ValueError('Unknown serializer: {!r}'.format(name)) from None
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def _json_loads(data):
+    return json.loads(bytes(data).decode('utf-8'))
+
+
+# Compact msgpack-like binary format. Small ints, short strings and
+# small containers fit type and value or length into one byte, other
+# values have type byte followed by varint, 8 byte float or varint
+# length prefixed payload. Unlike pickle and marshal it is safe to
+# decode data from untrusted peers. Codec is pure python, 'marshal'
+# is faster and about as compact for trusted peers.
+#
+#   0x00-0x7f  int 0..127          0xc5  str, varint length
+#   0x80-0x8f  dict, 0..15 items   0xc6  list, varint length
+#   0x90-0x9f  list, 0..15 items   0xc7  tuple, varint length
+#   0xa0-0xbf  str, 0..31 bytes    0xc8  dict, varint length
+#   0xc0 None, 0xc2 False          0xc9  int, varint length + bytes
+#   0xc3 True                      0xca  float, 8 bytes
+#   0xc4  bytes, varint length     0xcb  64 bit int, zigzag varint
+#   0xe0-0xff  int -32..-1
+_FLOAT = struct.Struct('<d')
+_INT_MIN, _INT_MAX = -2 ** 63, 2 ** 63 - 1
+_MAX_VARINT = 10
+_MAX_DEPTH = 100
+
+
+def _pack_varint(value, out):
+    while value > 0x7f:
+        out.append(0x80 | value & 0x7f)
+        value >>= 7
+    out.append(value)
+
+
+def _pack(obj, out):
+    tp = type(obj)
+    if tp is int:
+        if 0 <= obj <= 0x7f:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out.append(obj & 0xff)
+        elif _INT_MIN <= obj <= _INT_MAX:
+            out.append(0xcb)
+            _pack_varint((obj << 1) ^ (obj >> 63), out)
+        else:
+            data = obj.to_bytes(
+                (obj.bit_length() + 8) // 8, 'little', signed=True)
+            out.append(0xc9)
+            _pack_varint(len(data), out)
+            out += data
+    elif tp is str:
+        data = obj.encode('utf-8')
+        size = len(data)
+        if size < 32:
+            out.append(0xa0 | size)
+        else:
+            out.append(0xc5)
+            _pack_varint(size, out)
+        out += data
+    elif obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif tp is float:
+        out.append(0xca)
+        out += _FLOAT.pack(obj)
+    elif tp is bytes:
+        out.append(0xc4)
+        _pack_varint(len(obj), out)
+        out += obj
+    elif tp is list or tp is tuple:
+        size = len(obj)
+        if tp is list and size < 16:
+            out.append(0x90 | size)
+        else:
+            out.append(0xc6 if tp is list else 0xc7)
+            _pack_varint(size, out)
+        for item in obj:
+            _pack(item, out)
+    elif tp is dict:
+        size = len(obj)
+        if size < 16:
+            out.append(0x80 | size)
+        else:
+            out.append(0xc8)
+            _pack_varint(size, out)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError('Can not pack {!r}'.format(obj))
+
+
+def _unpack_varint(data, pos):
+    value = shift = 0
+    for pos in range(pos, pos + _MAX_VARINT):
+        byte = data[pos]
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos + 1
+        shift += 7
+    raise ValueError('Varint is too long')
+
+
+def _unpack(data, pos, depth=0):
+    tag = data[pos]
+    pos += 1
+    if tag < 0x80:
+        return tag, pos
+    elif tag >= 0xe0:
+        return tag - 0x100, pos
+    elif tag < 0xc0:
+        size = tag & 0x0f if tag < 0xa0 else tag & 0x1f
+        kind = tag & 0xe0 if tag >= 0xa0 else tag & 0xf0
+    elif tag == 0xc0:
+        return None, pos
+    elif tag == 0xc2:
+        return False, pos
+    elif tag == 0xc3:
+        return True, pos
+    elif tag == 0xca:
+        return _FLOAT.unpack_from(data, pos)[0], pos + 8
+    elif tag == 0xcb:
+        value, pos = _unpack_varint(data, pos)
+        return (value >> 1) ^ -(value & 1), pos
+    elif 0xc4 <= tag <= 0xc9:
+        size, pos = _unpack_varint(data, pos)
+        kind = tag
+    else:
+        raise ValueError('Unknown type tag: 0x{:02x}'.format(tag))
+
+    if kind in (0x80, 0x90, 0xc6, 0xc7, 0xc8):
+        if depth >= _MAX_DEPTH:
+            raise ValueError('Packed data is nested too deep')
+    elif pos + size > len(data):
+        raise IndexError(pos + size)
+
+    if kind == 0xa0 or kind == 0xc5:  # str
+        return data[pos:pos + size].decode('utf-8'), pos + size
+    elif kind == 0xc4:  # bytes
+        return data[pos:pos + size], pos + size
+    elif kind == 0xc9:  # big int
+        return (int.from_bytes(data[pos:pos + size], 'little', signed=True),
+                pos + size)
+    elif kind == 0x80 or kind == 0xc8:  # dict
+        obj = {}
+        for i in range(size):
+            key, pos = _unpack(data, pos, depth + 1)
+            if type(key) is not str:
+                try:
+                    hash(key)
+                except TypeError:
+                    raise ValueError(
+                        'Unhashable map key: {!r}'.format(key)) from None
+            obj[key], pos = _unpack(data, pos, depth + 1)
+        return obj, pos
+    else:  # list, tuple
+        items = []
+        for i in range(size):
+            item, pos = _unpack(data, pos, depth + 1)
+            items.append(item)
+        return (tuple(items) if kind == 0xc7 else items), pos
+
+
+def packed_dumps(obj):
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+
+def packed_loads(data):
+    data = bytes(data)
+    try:
+        obj, pos = _unpack(data, 0)
+    except (IndexError, struct.error):
+        raise ValueError('Truncated packed data') from None
+    except (TypeError, RecursionError) as exc:
+        raise ValueError('Invalid packed data: {}'.format(exc)) from None
+    if pos != len(data):
+        raise ValueError('Packed data length mismatch')
+    return obj
+
+
+register_serializer('pickle', pickle.dumps, pickle.loads)
+register_serializer('json', _json_dumps, _json_loads)
+register_serializer('marshal', marshal.dumps, marshal.loads)
+register_serializer('packed', packed_dumps, packed_loads)
@@ -0,0 +1,106 @@
+"""Low overhead socket instrumentation."""
+__all__ = ['Histogram', 'Counters']
+
+
+class Histogram:
+    """Latency histogram with fixed power of two buckets.
+
+    Bucket `i` counts values below 2**i microseconds, last bucket
+    counts everything above.
+    """
+
+    BUCKETS = 32
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._counts = [0] * self.BUCKETS
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    def record(self, seconds):
+        idx = int(seconds * 1000000).bit_length()
+        if idx >= self.BUCKETS:
+            idx = self.BUCKETS - 1
+        self._counts[idx] += 1
+        self._count += 1
+        self._sum += seconds
+        if seconds > self._max:
+            self._max = seconds
+
+    def percentile(self, percent):
+        """Return upper bound of bucket holding given percentile."""
+        if not self._count:
+            return 0.0
+        rank = self._count * percent / 100.0
+        total = 0
+        for idx, count in enumerate(self._counts):
+            total += count
+            if total >= rank and count:
+                bound = self._upper_bound(idx)
+                return self._max if bound is None else min(bound, self._max)
+        return self._max
+
+    def snapshot(self):
+        """Return histogram state as dict.
+
+        `buckets` is list of (upper bound in seconds, count) for
+        non-empty buckets, upper bound of last bucket is None.
+        """
+        buckets = [(self._upper_bound(idx), count)
+                   for idx, count in enumerate(self._counts) if count]
+        return {
+            'count': self._count,
+            'sum': self._sum,
+            'max': self._max,
+            'mean': self._sum / self._count if self._count else 0.0,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'buckets': buckets,
+        }
+
+    def _upper_bound(self, idx):
+        if idx == self.BUCKETS - 1:
+            return None
+        return (1 << idx) / 1000000
+
+
+class Counters:
+    """Socket counters.
+
+    `eagain` counts operations which would block and had to wait for
+    event loop, `peak_buffer` is the largest number of messages held
+    in send buffer, `threadsafe_wakeups` counts loop wakeups requested
+    by sends from other threads and `threadsafe_errors` counts messages
+    from other threads which were dropped.
+    """
+
+    __slots__ = ('messages_sent', 'bytes_sent',
+                 'messages_received', 'bytes_received',
+                 'eagain', 'peak_buffer',
+                 'reader_registrations', 'writer_registrations',
+                 'threadsafe_wakeups', 'threadsafe_errors')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def snapshot(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @staticmethod
+    def aggregate(snapshots):
+        """Sum snapshots, peak values are combined with max()."""
+        total = dict.fromkeys(Counters.__slots__, 0)
+        for snapshot in snapshots:
+            for name, value in snapshot.items():
+                if name.startswith('peak_'):
+                    total[name] = max(total.get(name, 0), value)
+                else:
+                    total[name] = total.get(name, 0) + value
+        return total